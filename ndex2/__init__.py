@@ -281,11 +281,14 @@ def create_nice_cx_from_raw_cx(cx):
     #my_nicecx = NiceCXNetwork()
 
     if cx:
+        # index the aspects once instead of rescanning cx for each one
+        frags = niceCxBuilder.get_frags_by_key(cx)
+
         # ===================
         # METADATA
         # ===================
         available_aspects = []
-        for ae in (o for o in niceCxBuilder.get_frag_from_list_by_key(cx, 'metaData')):
+        for ae in frags.get('metaData', []):
             available_aspects.append(ae.get('name'))
 
         opaque_aspects = set(available_aspects).difference(known_aspects_min)
@@ -294,7 +297,7 @@ def create_nice_cx_from_raw_cx(cx):
         # NETWORK ATTRIBUTES
         # ====================
         if 'networkAttributes' in available_aspects:
-            objects = niceCxBuilder.get_frag_from_list_by_key(cx, 'networkAttributes')
+            objects = frags.get('networkAttributes', [])
             for network_item in objects:
                 niceCxBuilder._add_network_attributes_from_fragment(network_item)
 
@@ -302,7 +305,7 @@ def create_nice_cx_from_raw_cx(cx):
         # NODES
         # ===================
         if 'nodes' in available_aspects:
-            objects = niceCxBuilder.get_frag_from_list_by_key(cx, 'nodes')
+            objects = frags.get('nodes', [])
             for node_item in objects:
                 niceCxBuilder._add_node_from_fragment(node_item)
 
@@ -310,7 +313,7 @@ def create_nice_cx_from_raw_cx(cx):
         # EDGES
         # ===================
         if 'edges' in available_aspects:
-            objects = niceCxBuilder.get_frag_from_list_by_key(cx, 'edges')
+            objects = frags.get('edges', [])
             for edge_item in objects:
                 niceCxBuilder._add_edge_from_fragment(edge_item)
 
@@ -318,7 +321,7 @@ def create_nice_cx_from_raw_cx(cx):
         # NODE ATTRIBUTES
         # ===================
         if 'nodeAttributes' in available_aspects:
-            objects = niceCxBuilder.get_frag_from_list_by_key(cx, 'nodeAttributes')
+            objects = frags.get('nodeAttributes', [])
             for att in objects:
                 niceCxBuilder._add_node_attribute_from_fragment(att)
 
@@ -326,7 +329,7 @@ def create_nice_cx_from_raw_cx(cx):
         # EDGE ATTRIBUTES
         # ===================
         if 'edgeAttributes' in available_aspects:
-            objects = niceCxBuilder.get_frag_from_list_by_key(cx, 'edgeAttributes')
+            objects = frags.get('edgeAttributes', [])
             for att in objects:
                 niceCxBuilder._add_edge_attribute_from_fragment(att)
 
@@ -334,7 +337,7 @@ def create_nice_cx_from_raw_cx(cx):
         # CITATIONS
         # ===================
         if 'citations' in available_aspects:
-            objects = niceCxBuilder.get_frag_from_list_by_key(cx, 'citations')
+            objects = frags.get('citations', [])
             for cit in objects:
                 niceCxBuilder._add_citation_from_fragment(cit)
 
@@ -342,7 +345,7 @@ def create_nice_cx_from_raw_cx(cx):
         # SUPPORTS
         # ===================
         if 'supports' in available_aspects:
-            objects = niceCxBuilder.get_frag_from_list_by_key(cx, 'supports')
+            objects = frags.get('supports', [])
             for sup in objects:
                 niceCxBuilder._add_supports_from_fragment(sup)
 
@@ -350,7 +353,7 @@ def create_nice_cx_from_raw_cx(cx):
         # EDGE SUPPORTS
         # ===================
         if 'edgeSupports' in available_aspects:
-            objects = niceCxBuilder.get_frag_from_list_by_key(cx, 'edgeSupports')
+            objects = frags.get('edgeSupports', [])
             for add_this_edge_sup in objects:
                 niceCxBuilder._add_edge_supports_from_fragment(add_this_edge_sup)
 
@@ -358,7 +361,7 @@ def create_nice_cx_from_raw_cx(cx):
         # NODE CITATIONS
         # ===================
         if 'nodeCitations' in available_aspects:
-            objects = niceCxBuilder.get_frag_from_list_by_key(cx, 'nodeCitations')
+            objects = frags.get('nodeCitations', [])
             for node_cit in objects:
                 niceCxBuilder._add_node_citations_from_fragment(node_cit)
 
@@ -366,7 +369,7 @@ def create_nice_cx_from_raw_cx(cx):
         # EDGE CITATIONS
         # ===================
         if 'edgeCitations' in available_aspects:
-            objects = niceCxBuilder.get_frag_from_list_by_key(cx, 'edgeCitations')
+            objects = frags.get('edgeCitations', [])
             for edge_cit in objects:
                 niceCxBuilder._add_edge_citations_from_fragment(edge_cit)
 
@@ -376,10 +379,10 @@ def create_nice_cx_from_raw_cx(cx):
         for oa in opaque_aspects:
             #TODO - Add context to builder
             if oa == '@context':
-                objects = niceCxBuilder.get_frag_from_list_by_key(cx, oa)
+                objects = frags.get(oa, [])
                 niceCxBuilder.set_context(objects) #nice_cx.set_namespaces(objects)
             else:
-                objects = niceCxBuilder.get_frag_from_list_by_key(cx, oa)
+                objects = frags.get(oa, [])
                 niceCxBuilder.add_opaque_aspect(oa, objects)
 
         return niceCxBuilder.get_nice_cx()
@@ -4,27 +4,96 @@ import requests
 import json
 import logging
 from requests_toolbelt import MultipartEncoder
-import io
-import sys
+from requests_toolbelt import MultipartEncoderMonitor
+from collections import deque
+from collections import OrderedDict
+import itertools
+import copy
+import threading
+import functools
+import ijson
 import decimal
-import numpy
+import sys
+import base64
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 from .version import __version__
 from .exceptions import NDExInvalidCXError
 from .exceptions import NDExUnauthorizedError
 from .exceptions import NDExError
-try:
-    from urllib.parse import urljoin
-except ImportError:
-     from urlparse import urljoin
+from .exceptions import NDExConcurrentModificationError
+from urllib.parse import urljoin
 
 from requests import exceptions as req_except
+from requests.adapters import HTTPAdapter
+from requests.auth import AuthBase
+from urllib3.util.retry import Retry
+from urllib3.util import make_headers
 import time
+import random
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import as_completed
+from concurrent.futures import Future
 
 userAgent = 'NDEx2-Python/' + __version__
 
 DEFAULT_SERVER = "http://public.ndexbio.org"
 
+ASSUMED_SERVER_VERSION = '2.1'
+
+# paths appended to the host to reach the REST API
+API_PATHS = ('/v2', '/rest')
+
+# every encoding urllib3 can decode here, which adds br and zstd
+# to gzip and deflate when brotli or zstandard are installed
+_ACCEPT_ENCODING = make_headers(accept_encoding=True)['accept-encoding']
+
+# per request headers, requests merges these into a copy of the session
+# headers so sharing them between calls and clients is safe
+_JSON_UTF8_HEADERS = {'Content-Type': 'application/json;charset=UTF-8'}
+_JSON_HEADERS = {'Content-Type': 'application/json'}
+_POST_JSON_HEADERS = {'Content-Type': 'application/json',
+                      'Accept': 'application/json,text/plain',
+                      'Cache-Control': 'no-cache'}
+
+# bodies sent to change network visibility on a 2.0 server, serialized
+# once. Other versions still pass update_network_profile() a dict so
+# its visibility check keeps rejecting the call
+_PUBLIC_BODY = json.dumps({'visibility': 'PUBLIC'}).encode('utf-8')
+_PRIVATE_BODY = json.dumps({'visibility': 'PRIVATE'}).encode('utf-8')
+_PUBLIC_INDEXED_BODY = json.dumps({'visibility': 'PUBLIC',
+                                   'index_level': 'ALL',
+                                   'showcase': True}).encode('utf-8')
+
+# REST routes that differ between a 2.0 server and every other
+# version, picked once when Ndex2.version is set
+_SERVER_2_0_ROUTES = {
+    'network_new': '/network',
+    'network_update': '/network/%s',
+    'network_cx': '/network/%s',
+    'network_aspect': '/network/%(network_id)s/aspect/%(aspect_name)s',
+    'neighborhood': '/search/network/%s/query',
+    'search_networks': '/search/network?start=%s&size=%s',
+    'search_network_nodes': '/search/network/%s/nodes?limit=%s',
+    'network_summary': '/network/%s/summary',
+    'user_network_summaries': '/user/%s/networksummary',
+}
+
+_SERVER_ROUTES = {
+    'network_new': '/network/asCX',
+    'network_update': '/network/asCX/%s',
+    'network_cx': '/network/%s/asCX',
+    'network_aspect': '/network/%(network_id)s/asCX',
+    'neighborhood': '/network/%s/query',
+    'search_networks': '/network/search/%s/%s',
+    'search_network_nodes': '/network/%s/nodes/%s',
+    'network_summary': '/network/%s',
+    'user_network_summaries': '/user/%s/networksummary/asCX',
+}
+
 
 class Ndex2(object):
     """ A class to facilitate communication with an
@@ -33,12 +102,48 @@ class Ndex2(object):
         If host is not provided it will default to the
         `NDEx public server <http://ndexbio.org>`_.  UUID is required
 
+        The client can be used as a context manager so its pooled
+        connections are closed when done:
+
+        .. code-block:: python
+
+            with Ndex2(host, my_account, my_password) as my_ndex:
+                my_ndex.get_network_summary(network_uuid)
+
     """
     USER_AGENT_KEY = 'User-Agent'
 
+    # number of hosts the adapter keeps a connection pool for, pool_size
+    # passed to the constructor sets the connections kept per host
+    POOL_HOSTS = 10
+
+    # methods the adapter retries on 502, 503 and 504. PUT and POST are
+    # left out, their multipart and streamed bodies are read as they are
+    # sent and a retry would go out with whatever is left of them
+    RETRY_METHODS = frozenset(['DELETE', 'GET', 'HEAD', 'OPTIONS', 'TRACE'])
+
+    # seconds a server version found by _discover_version() is reused
+    # by new instances talking to the same host, None never expires
+    VERSION_CACHE_TTL = 300
+
+    # seconds a user external id found by username is reused,
+    # None never expires
+    USER_ID_CACHE_TTL = 300
+
+    # most responses kept in the read cache enabled by passing
+    # cache_ttl to the constructor
+    READ_CACHE_SIZE = 1024
+
+    # network sets members lists longer than this are sent as a
+    # chunked body that is encoded as it is written to the socket
+    STREAM_CHUNK_SIZE = 1024
+
+    _version_cache = {}
+
     def __init__(self, host=None, username=None, password=None,
                  update_status=False, debug=False, user_agent='',
-                 timeout=30):
+                 timeout=30, pool_size=32, skip_version_check=False,
+                 cache_ttl=None, session=None):
         """
         Creates a connection to a particular `NDEx server <http://ndexbio.org>`_.
 
@@ -59,6 +164,33 @@ class Ndex2(object):
                         is passed to Request calls `Click Here for more information
                         <http://docs.python-requests.org/en/master/user/advanced/#timeouts>`_
         :type timeout: float or tuple(float, float)
+        :param pool_size: Maximum number of connections kept alive in the
+                          connection pool for each host
+        :type pool_size: int
+        :param skip_version_check: If True, server is assumed to be a
+                                   2.x server and is not queried for its
+                                   version
+        :type skip_version_check: bool
+        :param cache_ttl: Seconds the responses of
+                          :py:func:`get_network_summary`,
+                          :py:func:`get_provenance`,
+                          :py:func:`get_user_by_username`,
+                          :py:func:`get_network_set` and
+                          :py:func:`get_sample_network` are reused.
+                          Updates made through this client evict the
+                          cached responses of the network or network
+                          set they change.
+                          None, the default, disables the cache
+        :type cache_ttl: float
+        :param session: Session to send requests with instead of one
+                        created by this client, so several clients can
+                        share one connection pool or use a transport
+                        adapter mounted by the caller. The client sets
+                        its headers and credentials on the session, so
+                        clients sharing it must use the same account.
+                        **pool_size** is ignored and :py:func:`close`
+                        leaves the session open
+        :type session: :py:class:`requests.Session`
         """
         self.debug = debug
         self.version = 1.3
@@ -71,70 +203,235 @@ class Ndex2(object):
         else:
             if len(self.user_agent) > 0:
                 self.user_agent = ' ' + self.user_agent
+        self._ua = userAgent + self.user_agent
 
         self.logger = logging.getLogger(__name__)
         self.timeout = timeout
+        self._user_id_cache = {}
+        self._read_cache = None
+        # GETs being sent right now, see _get_json()
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        if cache_ttl:
+            self._read_cache = _TTLCache(Ndex2.READ_CACHE_SIZE, cache_ttl)
+
+        # create a session for this Ndex before querying the server
+        # so the connection opened to get the version is reused
+        self._owns_session = session is None
+        if self._owns_session:
+            self.s = requests.session()
+        else:
+            self.s = session
+        self.s.headers.update({Ndex2.USER_AGENT_KEY: self._ua,
+                               'Accept': 'application/json',
+                               'Accept-Encoding': _ACCEPT_ENCODING,
+                               'Connection': 'keep-alive'})
+        self.pool_size = pool_size
+        if self._owns_session:
+            self._mount_adapter(pool_size)
 
         if host is None:
             host = DEFAULT_SERVER
         elif 'http' not in host:
             host = 'http://' + host
+        host = Ndex2._strip_api_path(host)
 
         if "localhost" in host:
             self.host = "http://localhost:8080/ndexbio-rest"
+        elif skip_version_check:
+            self.version = ASSUMED_SERVER_VERSION
+            self.host = host + "/v2"
         else:
-            status_url = "/rest/admin/status"
+            self.version, self.host = self._discover_version(host)
 
-            try:
-                version_url = urljoin(host, status_url)
-
-                response = requests.get(version_url,
-                                        headers={Ndex2.USER_AGENT_KEY:
-                                                 userAgent + self.user_agent})
-                response.raise_for_status()
-                data = response.json()
-
-                prop = data.get('properties')
-                if prop is not None:
-                    pv = prop.get('ServerVersion')
-                    if pv is not None:
-                        if not pv.startswith('2.'):
-                            raise Exception("This release only supports NDEx 2.x server.")
-                        else:
-                            self.version = pv
-                            self.host = host + "/v2"
-                    else:
-                        self.logger.warning("Warning: This release doesn't fully "
-                                            "support 1.3 version of NDEx")
-                        self.version = "1.3"
-                        self.host = host + "/rest"
-                else:
-                    self.logger.warning("Warning: No properties found. "
-                                        "This release doesn't fully "
-                                        "support 1.3 version of NDEx")
-                    self.version = "1.3"
-                    self.host = host + "/rest"
-
-            except req_except.HTTPError as he:
-                self.logger.warning("Can't determine server version. " + host +
-                                    ' Server returned error -- ' + str(he) +
-                                    ' will assume 1.3 version of NDEx which' +
-                                    ' is not fully supported by this release')
-                self.version = "1.3"
-                self.host = host + "/rest"
-                # TODO - how to handle errors getting server version...
-
-        # create a session for this Ndex
-        self.s = requests.session()
-        if username and password:
+        self._authed = bool(username and password)
+        if self._authed:
             # add credentials to the session, if available
-            self.s.auth = (username, password)
+            self.s.auth = _PrecomputedBasicAuth(username, password)
 
         if update_status:
             self.update_status()
 
+    @staticmethod
+    def _strip_api_path(host):
+        """
+        Removes a trailing slash and REST API path (/v2 or /rest) from
+        `host` so the path appended once the server version is known
+        is not doubled up, ie http://public.ndexbio.org/v2/v2
+
+        :param host: URL of the server
+        :type host: string
+        :return: `host` without trailing / and API path
+        :rtype: string
+        """
+        host = host.rstrip('/')
+        for suffix in API_PATHS:
+            if host.endswith(suffix):
+                return host[:-len(suffix)]
+        return host
+
+    def _url(self, route):
+        """
+        Builds the full URL for **route** on this server
+
+        :param route: route, including leading /
+        :type route: string
+        :return: URL
+        :rtype: string
+        """
+        return self.host + route
+
+    @property
+    def version(self):
+        """
+        Version of the NDEx server this client talks to
+        """
+        return self._version
+
+    @version.setter
+    def version(self, value):
+        self._version = value
+        # the version does not change per request so pick
+        # the matching route templates here, once
+        if value == "2.0":
+            self._routes = _SERVER_2_0_ROUTES
+        else:
+            self._routes = _SERVER_ROUTES
+
+    def _discover_version(self, host):
+        """
+        Queries `host` for its NDEx server version. Results are cached at
+        the class level for :py:const:`VERSION_CACHE_TTL` seconds so
+        creating another client for the same host does not query the
+        server again. Failed queries are not cached.
+
+        :param host: URL of the server
+        :type host: string
+        :raises Exception: If server is a 1.x server
+        :return: (server version, host with REST path appended)
+        :rtype: tuple
+        """
+        cached = Ndex2._version_cache.get(host)
+        if cached is not None:
+            version, api_host, expires = cached
+            if expires is None or time.monotonic() < expires:
+                return version, api_host
+
+        status_url = "/rest/admin/status"
+
+        try:
+            version_url = urljoin(host, status_url)
+
+            response = self.s.get(version_url, timeout=self.timeout)
+            response.raise_for_status()
+            data = response.json()
+
+            prop = data.get('properties')
+            if prop is not None:
+                pv = prop.get('ServerVersion')
+                if pv is not None:
+                    if not pv.startswith('2.'):
+                        raise Exception("This release only supports NDEx 2.x server.")
+                    else:
+                        version = pv
+                        api_host = host + "/v2"
+                else:
+                    self.logger.warning("Warning: This release doesn't fully "
+                                        "support 1.3 version of NDEx")
+                    version = "1.3"
+                    api_host = host + "/rest"
+            else:
+                self.logger.warning("Warning: No properties found. "
+                                    "This release doesn't fully "
+                                    "support 1.3 version of NDEx")
+                version = "1.3"
+                api_host = host + "/rest"
+
+        except req_except.HTTPError as he:
+            self.logger.warning("Can't determine server version. %s"
+                                ' Server returned error -- %s'
+                                ' will assume 1.3 version of NDEx which'
+                                ' is not fully supported by this release',
+                                host, he)
+            # TODO - how to handle errors getting server version...
+            return "1.3", host + "/rest"
+
+        expires = None
+        if Ndex2.VERSION_CACHE_TTL is not None:
+            expires = time.monotonic() + Ndex2.VERSION_CACHE_TTL
+        Ndex2._version_cache[host] = (version, api_host, expires)
+        return version, api_host
+
 # Base methods for making requests to this NDEx
 
+    def _mount_adapter(self, pool_size):
+        """
+        Mounts an :py:class:`~requests.adapters.HTTPAdapter` on the session
+        so up to `pool_size` connections per host are kept alive and reused,
+        for up to :py:const:`POOL_HOSTS` hosts. Requests that fail with a
+        502, 503 or 504 status are retried with back off if their method
+        is in :py:const:`RETRY_METHODS`
+
+        :param pool_size: Maximum number of connections to keep in the
+                          pool for each host
+        :type pool_size: int
+        """
+        retry = Retry(total=3, backoff_factor=0.3,
+                      status_forcelist=(502, 503, 504),
+                      allowed_methods=Ndex2.RETRY_METHODS,
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=Ndex2.POOL_HOSTS,
+                              pool_maxsize=pool_size,
+                              max_retries=retry)
+        self.s.mount('http://', adapter)
+        self.s.mount('https://', adapter)
+
+    def _map_concurrently(self, func, items, concurrency=8):
+        """
+        Calls **func** once per entry in **items** from a pool of
+        threads sharing this client's session, so a batch of requests
+        costs about one round trip per **concurrency** requests instead
+        of one per request. The number of threads is capped at the
+        adapter `pool_size` so each gets a pooled connection.
+
+        If a call raises, the exception is raised when its result is
+        reached. Calls already submitted still run, but their results
+        are dropped.
+
+        :param func: function taking one entry of **items**
+        :type func: callable
+        :param items: values to call **func** with
+        :type items: iterable
+        :param concurrency: Maximum number of calls run at the same time
+        :type concurrency: int
+        :return: generator of (item, result) tuples in completion order
+        :rtype: tuple
+        """
+        items = list(items)
+        if not items:
+            return
+        workers = max(1, min(concurrency, self.pool_size, len(items)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(func, item): item for item in items}
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def close(self):
+        """
+        Closes the session along with any connections it keeps
+        alive in its pool. Requests made after this open new
+        connections. A session passed to the constructor is left
+        open for its owner to close.
+        """
+        if self._owns_session:
+            self.s.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
     def set_request_timeout(self, time_in_secs):
         """
         Sets request timeout.
@@ -150,15 +447,17 @@ class Ndex2(object):
 
     def debug_response(self, response):
         if self.debug:
-            self.logger.debug("status code: " + str(response.status_code))
+            self.logger.debug("status code: %s", response.status_code)
             if not response.status_code == requests.codes.ok:
-                self.logger.debug("response text: " + str(response.text))
+                self.logger.debug("response text: %s", response.text)
 
     def _require_auth(self):
         """
         :raises NDExUnauthorizedError: If no credentials are found in this object
         """
-        if not self.s.auth:
+        # credentials given to the constructor never change, only fall
+        # back to the session for auth set on it directly afterwards
+        if not self._authed and not self.s.auth:
             raise NDExUnauthorizedError("This method requires user authentication")
 
     def _get_user_agent(self):
@@ -166,7 +465,7 @@ class Ndex2(object):
         Creates string to use for User-Agent header
         :return: string containing User-Agent header value
         """
-        return userAgent + self.user_agent
+        return self._ua
 
     def _return_response(self, response,
                          returnfullresponse=False,
@@ -203,120 +502,229 @@ class Ndex2(object):
         else:
             return response.text
 
-    def put(self, route, put_json=None):
-        url = self.host + route
-        self.logger.debug("PUT route: " + url)
-        self.logger.debug("PUT json: " + str(put_json))
+    def _return_json(self, response):
+        """
+        Like :py:func:`_return_response`, but for routes known to
+        always reply with JSON, so the body is parsed without
+        looking at the content-type header
 
-        headers = self.s.headers
-        headers['Content-Type'] = 'application/json;charset=UTF-8'
-        headers['Accept'] = 'application/json'
-        headers[Ndex2.USER_AGENT_KEY] = self._get_user_agent()
+        :param response: response object from requests call
+        :return: parsed JSON or empty string if status code is 204
+        """
+        self.debug_response(response)
+        response.raise_for_status()
+        if response.status_code == 204:
+            return ""
+        return _loads(response.content)
+
+    def _get_json(self, route, get_params=None):
+        """
+        Issues a GET for a route that always replies with JSON
+
+        Threads asking for the same route and parameters while that
+        GET is still in flight wait for it instead of sending their own
+        request, and get a copy of its result or its exception. If any
+        thread joined, the one that sent the GET gets a copy as well, so
+        no caller is handed the object the others copy from.
+
+        :param route: route appended to host
+        :type route: string
+        :param get_params: query parameters
+        :type get_params: dict
+        :return: parsed JSON
+        """
+        key = (route, _params_key(get_params))
+        with self._inflight_lock:
+            entry = self._inflight.get(key)
+            leader = entry is None
+            if leader:
+                # the future and the number of threads waiting on it
+                entry = [Future(), 0]
+                self._inflight[key] = entry
+            else:
+                entry[1] += 1
+        future = entry[0]
+        if not leader:
+            return copy.deepcopy(future.result())
+
+        try:
+            res = self._send_get_json(route, get_params)
+        except BaseException as e:
+            with self._inflight_lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        # once the entry is removed no other thread can join, so the
+        # count of followers is final
+        with self._inflight_lock:
+            del self._inflight[key]
+            followers = entry[1]
+        future.set_result(res)
+        if followers:
+            return copy.deepcopy(res)
+        return res
+
+    def _send_get_json(self, route, get_params=None):
+        url = self._url(route)
+        self.logger.debug("GET route: %s", url)
+        response = self.s.get(url, params=get_params, timeout=self.timeout)
+        return self._return_json(response)
+
+    def _cached_get(self, route, get_params=None, network_id=None,
+                    cache=True):
+        """
+        Same as :py:func:`_get_json`, but reuses the response from the
+        read cache when it is enabled. Callers get their own copy of a
+        cached response so changing it does not change the cache.
+
+        :param route: route appended to host
+        :type route: string
+        :param get_params: query parameters
+        :type get_params: dict
+        :param network_id: network or network set the response
+                           describes, used by :py:func:`invalidate`
+                           to find it
+        :type network_id: string
+        :param cache: If False, the server is always queried and the
+                      cache is refreshed with the response
+        :type cache: bool
+        :return: parsed JSON
+        """
+        if self._read_cache is None:
+            return self._get_json(route, get_params=get_params)
+        key = (network_id, route, _params_key(get_params))
+        if cache:
+            res = self._read_cache.get(key)
+            if res is not None:
+                return copy.deepcopy(res)
+        res = self._get_json(route, get_params=get_params)
+        self._read_cache.set(key, res)
+        return copy.deepcopy(res)
+
+    def invalidate(self, network_id=None):
+        """
+        Evicts cached responses, see **cache_ttl** in the constructor
+
+        :param network_id: Network or network set whose responses to
+                           evict, if None the whole cache is cleared
+        :type network_id: string
+        """
+        if self._read_cache is None:
+            return
+        if network_id is None:
+            self._read_cache.clear()
+        else:
+            self._read_cache.pop_matching(lambda key: key[0] == network_id)
+
+    def put(self, route, put_json=None, put_params=None):
+        url = self._url(route)
+        self.logger.debug("PUT route: %s", url)
+        self.logger.debug("PUT json: %s", put_json)
 
         if put_json is not None:
-            response = self.s.put(url, data=put_json, headers=headers,
-                                  timeout=self.timeout)
+            response = self.s.put(url, data=put_json,
+                                  headers=_JSON_UTF8_HEADERS,
+                                  params=put_params, timeout=self.timeout)
         else:
-            response = self.s.put(url, headers=headers,
-                                  timeout=self.timeout)
+            response = self.s.put(url, headers=_JSON_UTF8_HEADERS,
+                                  params=put_params, timeout=self.timeout)
         return self._return_response(response)
 
     def post(self, route, post_json):
-        url = self.host + route
-        self.logger.debug("POST route: " + url)
-        self.logger.debug("POST json: " + post_json)
-        headers = {'Content-Type': 'application/json',
-                   'Accept': 'application/json,text/plain',
-                   'Cache-Control': 'no-cache',
-                   Ndex2.USER_AGENT_KEY: self._get_user_agent(),
-                   }
-        response = self.s.post(url, data=post_json, headers=headers,
+        url = self._url(route)
+        self.logger.debug("POST route: %s", url)
+        self.logger.debug("POST json: %s", post_json)
+        response = self.s.post(url, data=post_json,
+                               headers=_POST_JSON_HEADERS,
                                timeout=self.timeout)
         return self._return_response(response)
 
     def delete(self, route, data=None):
-        url = self.host + route
-        self.logger.debug("DELETE route: " + url)
-        headers = self.s.headers
-        headers[Ndex2.USER_AGENT_KEY] = userAgent + self.user_agent
+        url = self._url(route)
+        self.logger.debug("DELETE route: %s", url)
 
         if data is not None:
-            response = self.s.delete(url, headers=headers, data=data,
-                                     timeout=self.timeout)
+            response = self.s.delete(url, headers=_JSON_UTF8_HEADERS,
+                                     data=data, timeout=self.timeout)
         else:
-            response = self.s.delete(url, headers=headers,
-                                     timeout=self.timeout)
+            response = self.s.delete(url, timeout=self.timeout)
         return self._return_response(response)
 
     def get(self, route, get_params=None):
-        url = self.host + route
-        self.logger.debug("GET route: " + url)
-        headers = self.s.headers
-        headers[Ndex2.USER_AGENT_KEY] = self._get_user_agent()
-        response = self.s.get(url, params=get_params, headers=headers,
-                              timeout=self.timeout)
+        url = self._url(route)
+        self.logger.debug("GET route: %s", url)
+        response = self.s.get(url, params=get_params, timeout=self.timeout)
         return self._return_response(response)
 
     # The stream refers to the Response, not the Request
     def get_stream(self, route, get_params=None):
-        url = self.host + route
-        self.logger.debug("GET stream route: " + url)
-        headers = self.s.headers
-        headers[Ndex2.USER_AGENT_KEY] = self._get_user_agent()
+        url = self._url(route)
+        self.logger.debug("GET stream route: %s", url)
         response = self.s.get(url, params=get_params, stream=True,
-                              headers=headers, timeout=self.timeout)
+                              timeout=self.timeout)
         return self._return_response(response,
                                      returnfullresponse=True)
 
     # The stream refers to the Response, not the Request
     def post_stream(self, route, post_json):
-        url = self.host + route
-        self.logger.debug("POST stream route: " + url)
-        headers = self.s.headers
-
-        headers['Content-Type'] = 'application/json'
-        headers['Accept'] = 'application/json'
-        headers[Ndex2.USER_AGENT_KEY] = self._get_user_agent()
-        headers['Connection'] = 'close'
-        response = self.s.post(url, data=post_json, headers=headers,
+        url = self._url(route)
+        self.logger.debug("POST stream route: %s", url)
+        response = self.s.post(url, data=post_json, headers=_JSON_HEADERS,
                                stream=True, timeout=self.timeout)
         return self._return_response(response,
                                      returnfullresponse=True)
 
-    # The Request is streamed, not the Response
-    def put_multipart(self, route, fields):
-        url = self.host + route
+    @staticmethod
+    def _multipart_body(fields, progress_callback=None):
+        """
+        Creates the streamed body of a multipart request. If
+        **progress_callback** is set the encoder is wrapped in a
+        :py:class:`~requests_toolbelt.MultipartEncoderMonitor` which
+        calls it, passing the monitor, each time a chunk is read for
+        sending. ``monitor.bytes_read`` and ``monitor.len`` give the
+        progress of the upload.
+
+        :param fields: multipart fields
+        :type fields: dict
+        :param progress_callback: function taking the monitor
+        :type progress_callback: callable
+        :return: encoder or monitor, both have content_type
+        """
         multipart_data = MultipartEncoder(fields=fields)
-        self.logger.debug("PUT route: " + url)
-
-        headers = {'Content-Type': multipart_data.content_type,
-                   'Accept': 'application/json',
-                   Ndex2.USER_AGENT_KEY: self._get_user_agent(),
-                   'Connection': 'close'
-                   }
-        response = requests.put(url, data=multipart_data, headers=headers, auth=(self.username, self.password))
+        if progress_callback is None:
+            return multipart_data
+        return MultipartEncoderMonitor(multipart_data, progress_callback)
+
+    # The Request is streamed, not the Response
+    def put_multipart(self, route, fields, progress_callback=None):
+        url = self._url(route)
+        multipart_data = Ndex2._multipart_body(fields, progress_callback)
+        self.logger.debug("PUT route: %s", url)
+
+        headers = {'Content-Type': multipart_data.content_type}
+        response = self.s.put(url, data=multipart_data, headers=headers,
+                              timeout=self.timeout)
         return self._return_response(response,
                                      returnjsonundertry=True)
 
     # The Request is streamed, not the Response
-    def post_multipart(self, route, fields, query_string=None):
+    def post_multipart(self, route, fields, query_string=None,
+                       progress_callback=None):
         if query_string:
-            url = self.host + route + '?' + query_string
+            url = self._url(route) + '?' + query_string
         else:
-            url = self.host + route
-        multipart_data = MultipartEncoder(fields=fields)
-        self.logger.debug("POST route: " + url)
-        headers = {'Content-Type': multipart_data.content_type,
-                   Ndex2.USER_AGENT_KEY: self._get_user_agent(),
-                   'Connection': 'close'
-                   }
-        response = requests.post(url, data=multipart_data, headers=headers, auth=(self.username, self.password))
+            url = self._url(route)
+        multipart_data = Ndex2._multipart_body(fields, progress_callback)
+        self.logger.debug("POST route: %s", url)
+        headers = {'Content-Type': multipart_data.content_type}
+        response = self.s.post(url, data=multipart_data, headers=headers,
+                               timeout=self.timeout)
         return self._return_response(response,
                                      returnjsonundertry=True)
 
 # Network methods
 
-    def save_new_network(self, cx, visibility=None):
+    def save_new_network(self, cx, visibility=None, progress_callback=None):
         """
 
         Create a new network (cx) on the server
@@ -355,34 +763,37 @@ class Ndex2(object):
         :type cx: list of dicts
         :param visibility: Sets the visibility (PUBLIC or PRIVATE)
         :type visibility: string
+        :param progress_callback: Called as the upload is sent, see
+                                  :py:func:`save_cx_stream_as_new_network`
+        :type progress_callback: callable
         :raises NDExInvalidCXError: For invalid CX data
         :return: Response data
         :rtype: string or dict
         """
-        if cx is None:
-            raise NDExInvalidCXError('CX is None')
         if not isinstance(cx, list):
+            if cx is None:
+                raise NDExInvalidCXError('CX is None')
             raise NDExInvalidCXError('CX is not a list')
-        if len(cx) is 0:
+        if not cx:
             raise NDExInvalidCXError('CX appears to be empty')
 
         indexed_fields = None
         #TODO add functionality for indexed_fields when it's supported by the server
-        if cx[-1] is not None:
-            if cx[-1].get('status') is None:
+        last_aspect = cx[-1]
+        if last_aspect is not None:
+            status = last_aspect.get('status')
+            if status is None:
                 cx.append({"status": [{"error": "", "success": True}]})
-            else:
-                if len(cx[-1].get('status')) < 1:
-                    cx[-1].get('status').append({"error": "", "success": True})
+            elif not status:
+                status.append({"error": "", "success": True})
 
-            if sys.version_info.major == 3:
-                stream = io.BytesIO(json.dumps(cx, cls=DecimalEncoder).encode('utf-8'))
-            else:
-                stream = io.BytesIO(json.dumps(cx, cls=DecimalEncoder))
+        stream = _CXBytesStream(cx)
 
-        return self.save_cx_stream_as_new_network(stream, visibility=visibility)
+        return self.save_cx_stream_as_new_network(stream, visibility=visibility,
+                                                  progress_callback=progress_callback)
 
-    def save_cx_stream_as_new_network(self, cx_stream, visibility=None):
+    def save_cx_stream_as_new_network(self, cx_stream, visibility=None,
+                                      progress_callback=None):
         """
         Create a new network from a CX stream.
 	
@@ -403,10 +814,18 @@ class Ndex2(object):
 		#visibility is either PUBLIC or PRIVATE
 		my_ndex.save_cx_stream_as_new_network(query_result_cx_stream, visibility=PUBLIC)
 
-        :param cx_stream:  IO stream of cx
+        :param cx_stream:  IO stream of cx, read in chunks as the
+                           request is sent so an open file works
+                           without loading it into memory
         :type cx_stream: BytesIO
         :param visibility: Sets the visibility (PUBLIC or PRIVATE)
         :type visibility: string
+        :param progress_callback: If set, called with a
+                                  :py:class:`~requests_toolbelt.MultipartEncoderMonitor`
+                                  each time a chunk of the upload is read,
+                                  ``bytes_read`` and ``len`` on the monitor
+                                  give the progress
+        :type progress_callback: callable
         :raises NDExUnauthorizedError: If credentials are invalid or not set
         :return: Response data
         :rtype: string or dict
@@ -425,18 +844,17 @@ class Ndex2(object):
         elif visibility:
                 query_string = 'visibility=' + str(visibility)
 
-        if self.version == "2.0":
-            route = '/network'
-        else:
-            route = '/network/asCX'
+        route = self._routes['network_new']
 
         fields = {
             'CXNetworkStream': ('filename', cx_stream, 'application/octet-stream')
         }
 
-        return self.post_multipart(route, fields, query_string=query_string)
+        return self.post_multipart(route, fields, query_string=query_string,
+                                   progress_callback=progress_callback)
 
-    def update_cx_network(self, cx_stream, network_id):
+    def update_cx_network(self, cx_stream, network_id,
+                          progress_callback=None):
         """
         Update the network specified by UUID network_id using the CX stream cx_stream.
 	
@@ -454,6 +872,9 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
         :param cx_stream: The network stream.
         :param network_id: The UUID of the network.
         :type network_id: str
+        :param progress_callback: Called as the upload is sent, see
+                                  :py:func:`save_cx_stream_as_new_network`
+        :type progress_callback: callable
         :raises NDExUnauthorizedError: If credentials are invalid or not set
         :return: The response.
         :rtype: `response object <http://docs.python-requests.org/en/master/user/quickstart/#response-content>`_
@@ -464,12 +885,12 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
             'CXNetworkStream': ('filename', cx_stream, 'application/octet-stream')
         }
 
-        if self.version == "2.0":
-            route = "/network/%s" % network_id
-        else:
-            route = '/network/asCX/%s' % network_id
+        route = self._routes['network_update'] % network_id
 
-        return self.put_multipart(route, fields)
+        res = self.put_multipart(route, fields,
+                                 progress_callback=progress_callback)
+        self.invalidate(network_id)
+        return res
 
     def get_network_as_cx_stream(self, network_id):
         """
@@ -518,10 +939,7 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
 
         """
 
-        if self.version == "2.0":
-            route = "/network/%s" % network_id
-        else:
-            route = "/network/%s/asCX" % network_id
+        route = self._routes['network_cx'] % network_id
 
         return self.get_stream(route)
 
@@ -537,10 +955,8 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
 
         """
 
-        if self.version == "2.0":
-            route = "/network/%s/aspect/%s" % (network_id, aspect_name)
-        else:
-            route = "/network/%s/asCX" % network_id
+        route = self._routes['network_aspect'] % {'network_id': network_id,
+                                                  'aspect_name': aspect_name}
 
         return self.get_stream(route)
 
@@ -582,19 +998,73 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
         :rtype: `response object <http://docs.python-requests.org/en/master/user/quickstart/#response-content>`_
 
         """
-        if self.version == "2.0":
-            route = "/search/network/%s/query" % network_id
-        else:
-            route = "/network/%s/query" % network_id
+        route = self._routes['neighborhood'] % network_id
 
         post_data = {'searchString': search_string,
                      'searchDepth': search_depth,
                      'edgeLimit': edge_limit,
                      'errorWhenLimitIsOver': error_when_limit}
-        post_json = json.dumps(post_data)
+        post_json = _dumps(post_data)
         return self.post_stream(route, post_json=post_json)
 
-    def get_neighborhood(self, network_id, search_string, search_depth=1, edge_limit=2500):
+    def get_neighborhoods_as_cx_streams(self, network_id, search_strings,
+                                        search_depth=1, edge_limit=2500,
+                                        error_when_limit=True, concurrency=8):
+        """
+        Runs :py:func:`get_neighborhood_as_cx_stream` for each of the
+        **search_strings** with up to **concurrency** queries in flight
+        at once, yielding results in the order they complete rather than
+        the order of **search_strings**
+
+        .. code-block:: python
+
+            import ndex2.client
+
+            my_ndex = ndex2.client.Ndex2("http://public.ndexbio.org",
+                                         'your account', 'your password')
+
+            names = [node['n'] for node_id, node in nice_cx_network.get_nodes()]
+            for name, res in my_ndex.get_neighborhoods_as_cx_streams(network_uuid,
+                                                                     names):
+                print(name, res.json())
+
+        .. note::
+
+            The queries share the underlying :py:class:`requests.Session`,
+            which is fine for issuing requests from several threads, but
+            the session (headers, auth etc.) must not be modified while
+            this generator is being consumed. **concurrency** is capped at
+            the `pool_size` passed to the constructor so every query gets
+            a pooled connection.
+
+        :param network_id: The UUID of the network.
+        :type network_id: str
+        :param search_strings: The search strings, one query is run per string.
+        :type search_strings: list
+        :param search_depth: The depth of the neighborhood from the core nodes identified.
+        :type search_depth: int
+        :param edge_limit: The maximum size of each neighborhood.
+        :type edge_limit: int
+        :param error_when_limit: See :py:func:`get_neighborhood_as_cx_stream`
+        :type error_when_limit: boolean
+        :param concurrency: Maximum number of queries run at the same time
+        :type concurrency: int
+        :raises HTTPError: from the first query to fail, remaining queries
+                           are still run but their results are dropped
+        :return: generator of (search string, response) tuples
+        :rtype: tuple
+        """
+        def query(search_string):
+            return self.get_neighborhood_as_cx_stream(network_id, search_string,
+                                                      search_depth=search_depth,
+                                                      edge_limit=edge_limit,
+                                                      error_when_limit=error_when_limit)
+
+        return self._map_concurrently(query, search_strings,
+                                      concurrency=concurrency)
+
+    def get_neighborhood(self, network_id, search_string, search_depth=1, edge_limit=2500,
+                         stream=False):
         """
 
         Get the CX for a subnetwork of the network specified by UUID network_id and a traversal of search_depth steps
@@ -632,6 +1102,10 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
         :type search_depth: int
         :param edge_limit: The maximum size of the neighborhood.
         :type edge_limit: int
+        :param stream: If True, return a generator that parses the aspects
+                       one at a time as they are read off the connection
+                       instead of a list, see :py:func:`_stream_query_result`
+        :type stream: bool
         :return: The CX json object.
         :rtype: `response object <http://docs.python-requests.org/en/master/user/quickstart/#response-content>`_
         """
@@ -642,13 +1116,9 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
             # response_in_json = response.json()
             # data =  response_in_json["data"]
             # return data
-            response_json = response.json()
-            if isinstance(response_json, dict):
-                return response_json.get('data')
-            elif isinstance(response_json, list):
-                return response_json
-            else:
-                return response_json
+            if stream:
+                return self._stream_query_result(response)
+            return self._get_query_result(response)
         else:
             raise Exception("get_neighborhood is not supported for versions prior to 2.0, "
                             "use get_neighborhood_as_cx_stream")
@@ -681,12 +1151,12 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
                      'searchDepth': search_depth,
                      'edgeLimit': edge_limit,
                      'errorWhenLimitIsOver': error_when_limit}
-        post_json = json.dumps(post_data)
+        post_json = _dumps(post_data)
         return self.post_stream(route, post_json=post_json)
 
     def get_interconnectquery(self, network_id, search_string,
                               search_depth=1, edge_limit=2500,
-                              error_when_limit=True):
+                              error_when_limit=True, stream=False):
         """
         Gets a CX network for a neighborhood subnetwork where all the
         paths must start and end at one of the query nodes in the network
@@ -702,6 +1172,10 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
         :type edge_limit: int
         :param error_when_limit: Default value is true. If this value is true the server will stop streaming the network when it hits the edgeLimit, add success: false and error: "EdgeLimitExceeded" in the status aspect and close the CX stream. If this value is set to false the server will return a subnetwork with edge count up to edgeLimit. The status aspect will be a success, and a network attribute {"EdgeLimitExceeded": "true"} will be added to the returned network only if the server hits the edgeLimit..
         :type error_when_limit: boolean
+        :param stream: If True, return a generator that parses the aspects
+                       one at a time as they are read off the connection
+                       instead of a list, see :py:func:`_stream_query_result`
+        :type stream: bool
         :return: The CX json object.
         :rtype: list
         """
@@ -710,13 +1184,69 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
                                                            search_depth=search_depth,
                                                            edge_limit=edge_limit,
                                                            error_when_limit=error_when_limit)
-        response_json = response.json()
+        if stream:
+            return self._stream_query_result(response)
+        return self._get_query_result(response)
+
+    def _get_query_result(self, response):
+        """
+        Parses the body of a neighborhood or interconnect query response
+        once, returning the value of `data` if the server wrapped the CX
+        in an object
+
+        :param response: response from a query ``_as_cx_stream`` method
+        :type response: :py:class:`requests.Response`
+        :raises NDExInvalidCXError: If the body is empty or not valid JSON
+        :return: The CX json object.
+        :rtype: list
+        """
+        try:
+            response_json = _loads(response.content)
+        except ValueError as e:
+            raise NDExInvalidCXError('Query response is not valid '
+                                     'JSON: %s' % e)
         if isinstance(response_json, dict):
             return response_json.get('data')
-        elif isinstance(response_json, list):
-            return response_json
-        else:
-            return response_json
+        return response_json
+
+    def _stream_query_result(self, response):
+        """
+        Generator version of :py:func:`_get_query_result` that parses
+        aspects with ijson straight from the connection, so only the
+        aspect being yielded is held in memory rather than the whole
+        response body and the parsed CX.
+
+        Like :py:func:`~ndex2.create_nice_cx_from_server`, which also
+        uses ijson, non integer numbers come back as
+        :py:class:`decimal.Decimal`
+
+        :param response: streamed response from a query
+                         ``_as_cx_stream`` method
+        :type response: :py:class:`requests.Response`
+        :raises NDExInvalidCXError: If the body is empty, cut short or
+                                    not valid JSON, raised once the
+                                    generator reaches the bad input
+        :return: generator of CX aspects
+        :rtype: generator
+        """
+        # let urllib3 undo any gzip/deflate encoding as ijson reads
+        response.raw.decode_content = True
+        events = ijson.parse(response.raw)
+        try:
+            # ijson raises IncompleteJSONError, not StopIteration, when
+            # the body is empty or ends early
+            first = next(events)
+            # the server may wrap the CX in an object under 'data'
+            if first[1] == 'start_map':
+                prefix = 'data.item'
+            else:
+                prefix = 'item'
+            for aspect in ijson.items(itertools.chain([first], events),
+                                      prefix):
+                yield aspect
+        except ijson.JSONError as e:
+            raise NDExInvalidCXError('Query response is not valid '
+                                     'JSON: %s' % e)
 
     def search_networks(self, search_string="", account_name=None, start=0, size=100, include_groups=False):
         """
@@ -757,26 +1287,20 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
 
         """
         post_data = {"searchString": search_string}
-        if self.version == "2.0":
-            route = "/search/network?start=%s&size=%s" % (start, size)
-            if include_groups:
-                post_data["includeGroups"] = True
-        else:
-            route = "/network/search/%s/%s" % (start, size)
+        route = self._routes['search_networks'] % (start, size)
+        if include_groups and self.version == "2.0":
+            post_data["includeGroups"] = True
 
         if account_name:
             post_data["accountName"] = account_name
-        post_json = json.dumps(post_data)
+        post_json = _dumps(post_data)
         return self.post(route, post_json)
 
     def search_network_nodes(self, network_id, search_string='', limit=5):
         post_data = {"searchString": search_string}
-        if self.version == "2.0":
-            route = "/search/network/%s/nodes?limit=%s" % (network_id, limit)
-        else:
-            route = "/network/%s/nodes/%s" % (network_id, limit)
+        route = self._routes['search_network_nodes'] % (network_id, limit)
 
-        post_json = json.dumps(post_data)
+        post_json = _dumps(post_data)
         return self.post(route, post_json)
 
     def find_networks(self, search_string="", account_name=None, skip_blocks=0, block_size=100):
@@ -787,12 +1311,9 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
         raise Exception("This function is not supported in NDEx 2.0")
 
     def network_summaries_to_ids(self, network_summaries):
-        network_ids = []
-        for network in network_summaries:
-            network_ids.append(network['externalId'])
-        return network_ids
+        return [network['externalId'] for network in network_summaries]
 
-    def get_network_summary(self, network_id):
+    def get_network_summary(self, network_id, cache=True):
         """
         Gets information about a network.
 
@@ -838,16 +1359,40 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
 
         :param network_id: The UUID of the network.
         :type network_id: str
+        :param cache: If False, the read cache is bypassed, see
+                      **cache_ttl** in the constructor
+        :type cache: bool
         :return: Summary
         :rtype: dict
 
         """
-        if self.version == "2.0":
-            route = "/network/%s/summary" % network_id
-        else:
-            route = "/network/%s" % network_id
+        route = self._routes['network_summary'] % network_id
+
+        return self._cached_get(route, network_id=network_id, cache=cache)
+
+    def get_network_summaries(self, network_ids, concurrency=8):
+        """
+        Gets the summaries of many networks, sending up to **concurrency**
+        :py:func:`get_network_summary` calls at the same time over the
+        pooled session. A summary that cannot be retrieved does not stop
+        the others, its exception is returned in place of the summary.
+
+        :param network_ids: Network ids
+        :type network_ids: list
+        :param concurrency: Maximum number of summaries requested at the
+                            same time
+        :type concurrency: int
+        :return: Summary, or exception raised, keyed by network id
+        :rtype: dict
+        """
+        def summary(network_id):
+            try:
+                return self.get_network_summary(network_id)
+            except Exception as e:
+                return e
 
-        return self.get(route)
+        return dict(self._map_concurrently(summary, network_ids,
+                                           concurrency=concurrency))
 
     def make_network_public(self, network_id):
         """
@@ -877,7 +1422,7 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
 
         """
         if self.version == "2.0":
-            return self.set_network_system_properties(network_id, {'visibility': 'PUBLIC'})
+            return self.set_network_system_properties(network_id, _PUBLIC_BODY)
 
         else:
             return self.update_network_profile(network_id, {'visibility': 'PUBLIC'})
@@ -893,13 +1438,17 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
 
         """
         if self.version == "2.0":
-            for i in range(0, 4):
+            attempts = 4
+            for attempt in range(attempts):
                 try:
-                    return_message = self.set_network_system_properties(network_id, {'visibility': 'PUBLIC', 'index_level': 'ALL', 'showcase': True})
+                    return self.set_network_system_properties(network_id, _PUBLIC_INDEXED_BODY)
                 except Exception as exc:
-                    time.sleep(1)
+                    last_exc = exc
+                    # nothing left to wait for after the last attempt
+                    if attempt < attempts - 1:
+                        time.sleep(_backoff_delay(attempt))
 
-            return return_message
+            raise last_exc
 
         else:
             return self.update_network_profile(network_id, {'visibility': 'PUBLIC'})
@@ -932,7 +1481,7 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
 
         """
         if self.version == "2.0":
-            return self.set_network_system_properties(network_id, {'visibility': 'PRIVATE'})
+            return self.set_network_system_properties(network_id, _PRIVATE_BODY)
 
         else:
             return self.update_network_profile(network_id, {'visibility': 'PRIVATE'})
@@ -961,9 +1510,10 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
         """
         self._require_auth()
         route = "/task/%s" % task_id
-        return self.get(route)
+        return self._get_json(route)
 
-    def delete_network(self, network_id, retry=5):
+    def delete_network(self, network_id, retry=5, base_delay=0.05,
+                       max_delay=2.0):
         """            
 
         Deletes the specified network from the server
@@ -997,27 +1547,77 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
         :type network_id: string
         :param retry: Number of times to retry if deleting fails
         :type retry: int
+        :param base_delay: Seconds to wait before the first retry, doubled
+                           for each retry after that, see :py:func:`_backoff_delay`
+        :type base_delay: float
+        :param max_delay: Most seconds to wait between retries
+        :type max_delay: float
         :raises NDExUnauthorizedError: If credentials are invalid or not set
+        :raises NDExConcurrentModificationError: If the network is still
+                                                 locked after **retry** tries
         :return: Error json if there is an error.  Blank
         :rtype: string
         """
         self._require_auth()
         route = "/network/%s" % network_id
+        delete = self.delete
+        logger = self.logger
         count = 0
         while count < retry:
             try:
-                return self.delete(route)
-            except Exception as inst:
-                d = json.loads(inst.response.content)
-                if d.get('errorCode').startswith("NDEx_Concurrent_Modification"):
-                    self.logger.debug("retry deleting network in 1 second(" + str(count) + ")")
-                    count += 1
-                    time.sleep(1)
-                else:
-                    raise inst
-        raise Exception("Network is locked after " + str(retry) + " retry.")
+                res = delete(route)
+                self.invalidate(network_id)
+                return res
+            except req_except.HTTPError as inst:
+                if not _is_concurrent_modification(inst):
+                    raise
+                count += 1
+                if count < retry:
+                    delay = _backoff_delay(count - 1, base_delay=base_delay,
+                                           max_delay=max_delay)
+                    logger.debug("retry deleting network in %.3f "
+                                 "seconds(%s)", delay, count)
+                    time.sleep(delay)
+        raise NDExConcurrentModificationError("Network is locked after " +
+                                              str(retry) + " retry.")
+
+    def delete_networks(self, network_ids, retry=5, concurrency=8):
+        """
+        Deletes many networks, sending up to **concurrency**
+        :py:func:`delete_network` calls at the same time over the pooled
+        session. A network that fails to delete does not stop the others,
+        its exception is returned in place of a result.
+
+        .. code-block:: python
+
+            list_uuid = my_ndex.get_network_ids_for_user(my_account)
+            res = my_ndex.delete_networks(list_uuid)
+            failed = [n for n, r in res.items() if isinstance(r, Exception)]
+
+        :param network_ids: Network ids
+        :type network_ids: list
+        :param retry: Number of times to retry each network if deleting
+                      fails, see :py:func:`delete_network`
+        :type retry: int
+        :param concurrency: Maximum number of networks deleted at the same time
+        :type concurrency: int
+        :raises NDExUnauthorizedError: If credentials are invalid or not set
+        :return: Result, or exception raised, of each delete keyed by
+                 network id
+        :rtype: dict
+        """
+        self._require_auth()
+
+        def delete(network_id):
+            try:
+                return self.delete_network(network_id, retry=retry)
+            except Exception as e:
+                return e
 
-    def get_provenance(self, network_id):
+        return dict(self._map_concurrently(delete, network_ids,
+                                           concurrency=concurrency))
+
+    def get_provenance(self, network_id, cache=True):
         """
 
         Gets the network provenance
@@ -1040,11 +1640,14 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
 
         :param network_id: Network id
         :type network_id: string
+        :param cache: If False, the read cache is bypassed, see
+                      **cache_ttl** in the constructor
+        :type cache: bool
         :return: Provenance
         :rtype: dict
         """
         route = "/network/%s/provenance" % network_id
-        return self.get(route)
+        return self._cached_get(route, network_id=network_id, cache=cache)
 
     def set_provenance(self, network_id, provenance):
         """
@@ -1061,16 +1664,15 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
         :param provenance: Network provcenance
         :type provenance: dict
         :raises NDExUnauthorizedError: If credentials are invalid or not set
+        :raises NDExError: If **provenance** is not a str, dict or list
         :return: Result
         :rtype: dict
         """
         self._require_auth()
         route = "/network/%s/provenance" % network_id
-        if isinstance(provenance, dict):
-            put_json = json.dumps(provenance)
-        else:
-            put_json = provenance
-        return self.put(route, put_json)
+        res = self.put(route, _as_json_body(provenance, 'provenance'))
+        self.invalidate(network_id)
+        return res
 
     def set_read_only(self, network_id, value):
         """
@@ -1132,18 +1734,16 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
         :param network_properties: List of NDEx property value pairs
         :type network_properties: list
         :raises NDExUnauthorizedError: If credentials are invalid or not set
+        :raises NDExError: If **network_properties** is not a str, dict or list
         :return:
         :rtype:
         """
         self._require_auth()
         route = "/network/%s/properties" % network_id
-        if isinstance(network_properties, list):
-            put_json = json.dumps(network_properties)
-        elif isinstance(network_properties, str):
-            put_json = network_properties
-        else:
-            raise Exception("network_properties must be a string or a list of NdexPropertyValuePair objects")
-        return self.put(route, put_json)
+        res = self.put(route, _as_json_body(network_properties,
+                                            'network_properties'))
+        self.invalidate(network_id)
+        return res
 
     def set_network_sample(self, network_id, sample_cx_network_str):
         """
@@ -1156,7 +1756,9 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
         self._require_auth()
         route = "/network/%s/sample" % network_id
     #    putJson = json.dumps(sample_cx_network_str)
-        return self.put(route, sample_cx_network_str)
+        res = self.put(route, sample_cx_network_str)
+        self.invalidate(network_id)
+        return res
 
     def set_network_system_properties(self, network_id, network_properties):
         """
@@ -1189,18 +1791,16 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
         :param network_properties: Network properties
         :type network_properties: dict of NDEx network property value pairs
         :raises NDExUnauthorizedError: If credentials are invalid or not set
+        :raises NDExError: If **network_properties** is not a str, dict or list
         :return: Result
         :rtype: dict
         """
         self._require_auth()
         route = "/network/%s/systemproperty" % network_id
-        if isinstance(network_properties, dict):
-            put_json = json.dumps(network_properties)
-        elif isinstance(network_properties, str):
-            put_json = network_properties
-        else:
-            raise Exception("network_properties must be a string or a dict")
-        return self.put(route, put_json)
+        res = self.put(route, _as_json_body(network_properties,
+                                            'network_properties'))
+        self.invalidate(network_id)
+        return res
 
     def update_network_profile(self, network_id, network_profile):
         """
@@ -1232,27 +1832,34 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
         :param network_profile: Network profile
         :type network_profile: dict
         :raises NDExUnauthorizedError: If credentials are invalid or not set
+        :raises NDExError: If **network_profile** is not a str, dict or list
         :return:
         :rtype:
         """
 
         self._require_auth()
-        if isinstance(network_profile, dict):
-            if network_profile.get("visibility") and self.version.startswith("2."):
+        json_data = _as_json_body(network_profile, 'network_profile')
+        if self.version.startswith("2."):
+            # check str and bytes bodies too, not just dicts
+            profile = network_profile
+            if not isinstance(profile, dict):
+                try:
+                    profile = _loads(json_data)
+                except ValueError:
+                    # not JSON, left for the server to reject
+                    profile = None
+            if isinstance(profile, dict) and profile.get("visibility"):
                 raise Exception("Ndex 2.x doesn't support setting visibility by this function. "
                                 "Please use make_network_public/private function to set network visibility.")
-            json_data = json.dumps(network_profile)
-        elif isinstance(network_profile, str):
-            json_data = network_profile
-        else:
-            raise Exception("network_profile must be a string or a dict")
 
         if self.version == "2.0":
             route = "/network/%s/profile" % network_id
-            return self.put(route, json_data)
+            res = self.put(route, json_data)
         else:
             route = "/network/%s/summary" % network_id
-            return self.post(route, json_data)
+            res = self.post(route, json_data)
+        self.invalidate(network_id)
+        return res
 
     def upload_file(self, filename):
         raise NDExError("This function is not supported in this release. Please use the save_new_network "
@@ -1285,8 +1892,9 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
         :return: Result
         :rtype: dict
         """
-        route = "/network/%s/permission?groupid=%s&permission=%s" % (networkid, groupid, permission)
-        self.put(route)
+        route = "/network/%s/permission" % networkid
+        return self.put(route, put_params={'groupid': groupid,
+                                           'permission': permission})
 
     def update_network_user_permission(self, userid, networkid, permission):
         """
@@ -1314,10 +1922,12 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
         :return: Result
         :rtype: dict
         """
-        route = "/network/%s/permission?userid=%s&permission=%s" % (networkid, userid, permission)
-        self.put(route)
+        route = "/network/%s/permission" % networkid
+        return self.put(route, put_params={'userid': userid,
+                                           'permission': permission})
 
-    def grant_networks_to_group(self, groupid, networkids, permission="READ"):
+    def grant_networks_to_group(self, groupid, networkids, permission="READ",
+                                concurrency=8):
         """
         Set group permission for a set of networks
 	
@@ -1347,13 +1957,50 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
         :type networkids: list
         :param permission: Network permission
         :type permission: string
-        :return: Result
+        :param concurrency: Maximum number of networks updated at the same time
+        :type concurrency: int
+        :return: Result, or exception raised, of each update keyed by
+                 network id, see :py:func:`_bulk_update_permissions`
+        :rtype: dict
+        """
+        return self._bulk_update_permissions(self.update_network_group_permission,
+                                             groupid, networkids, permission,
+                                             concurrency=concurrency)
+
+    def _bulk_update_permissions(self, update_permission, principal_id,
+                                 networkids, permission, concurrency=8):
+        """
+        Applies **permission** for a user or group to many networks. The
+        NDEx REST API only updates one network per request, so the updates
+        are sent concurrently over the pooled session instead of batched
+        into one call. A network that fails to update does not stop the
+        others, its exception is returned in place of a result.
+
+        :param update_permission: :py:func:`update_network_group_permission`
+                                  or :py:func:`update_network_user_permission`
+        :type update_permission: callable
+        :param principal_id: Group or user id passed to **update_permission**
+        :type principal_id: string
+        :param networkids: Network ids
+        :type networkids: list of strings
+        :param permission: Network permission
+        :type permission: string
+        :param concurrency: Maximum number of networks updated at the same time
+        :type concurrency: int
+        :return: Result, or exception raised, of each update keyed by
+                 network id
         :rtype: dict
         """
-        for networkid in networkids:
-            self.update_network_group_permission(groupid, networkid, permission)
+        def grant(networkid):
+            try:
+                return update_permission(principal_id, networkid, permission)
+            except Exception as e:
+                return e
 
-    def get_user_by_username(self, username):
+        return dict(self._map_concurrently(grant, networkids,
+                                           concurrency=concurrency))
+
+    def get_user_by_username(self, username, cache=True):
         """
 
         Gets the user id by user name
@@ -1387,11 +2034,40 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
 
         :param username: User name
         :type username: string
+        :param cache: If False, the read cache is bypassed, see
+                      **cache_ttl** in the constructor
+        :type cache: bool
         :return: User id
         :rtype: string
         """
-        route = "/user?username=%s" % username
-        return self.get(route)
+        return self._cached_get('/user', get_params={'username': username},
+                                cache=cache)
+
+    def _get_user_external_id(self, username):
+        """
+        Gets the external id of the user with **username**. Ids are
+        kept for :py:const:`USER_ID_CACHE_TTL` seconds so paging through
+        a user's networks does not look the user up for every page.
+
+        :param username: User name
+        :type username: string
+        :return: User external id
+        :rtype: string
+        """
+        cached = self._user_id_cache.get(username)
+        now = time.monotonic()
+        if cached is not None:
+            user_id, expires = cached
+            if expires is None or now < expires:
+                return user_id
+
+        user_id = self.get_user_by_username(username)['externalId']
+        if Ndex2.USER_ID_CACHE_TTL is None:
+            expires = None
+        else:
+            expires = now + Ndex2.USER_ID_CACHE_TTL
+        self._user_id_cache[username] = (user_id, expires)
+        return user_id
 
     def get_network_summaries_for_user(self, username):
         network_summaries = self.get_user_network_summaries(username)
@@ -1435,22 +2111,116 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
         :rtype: list
         """
 
-        route = ""
-        user = self.get_user_by_username(username)#.json
-        if self.version == "2.0":
-            route = "/user/%s/networksummary?offset=%s&limit=%s" % (user['externalId'], offset, limit)
-        else:
-            route = "/user/%s/networksummary/asCX?offset=%s&limit=%s" % (user['externalId'], offset, limit)
-
-        network_summaries = self.get_stream(route)
-
+        user_id = self._get_user_external_id(username)
+        route = self._routes['user_network_summaries'] % user_id
         # uuids = None
         # if network_summaries:
         #    uuids = [d.get('externalId') for d in network_summaries.json()]
-        if network_summaries:
-            return network_summaries.json()
-        else:
+        network_summaries = self._get_json(route, get_params={'offset': offset,
+                                                              'limit': limit})
+        if network_summaries == '':
             return None
+        return network_summaries
+
+    def iter_user_network_summaries(self, username, offset=0, limit=1000):
+        """
+        Generator version of :py:func:`get_user_network_summaries` that
+        parses the summaries one at a time with ijson as they are read
+        off the connection, instead of holding the whole response and
+        the full list in memory.
+
+        .. code-block:: python
+
+            for summary in my_ndex.iter_user_network_summaries(username):
+                print(summary['name'])
+
+        :param username: the username of the network owner
+        :type username: str
+        :param offset: the starting position of the network search
+        :type offset: int
+        :param limit: maximum number of summaries to get
+        :type limit: int
+        :return: generator of network summaries
+        :rtype: generator
+        """
+        network_summaries = self._get_user_network_summaries_stream(username,
+                                                                    offset,
+                                                                    limit)
+        if not network_summaries:
+            return
+        # let urllib3 undo any gzip/deflate encoding as ijson reads
+        network_summaries.raw.decode_content = True
+        for summary in ijson.items(network_summaries.raw, 'item'):
+            yield summary
+
+    def iter_all_user_network_summaries(self, username, page_size=100,
+                                        concurrency=4):
+        """
+        Gets every network summary for **username**, paging through
+        :py:func:`get_user_network_summaries` **page_size** summaries at a
+        time so the server never has to build one huge response.
+        **concurrency** pages are requested ahead of the one being
+        yielded, so the next pages download while the caller works
+        through the current one. Summaries are yielded in order.
+
+        The server does not report how many networks there are, so
+        paging stops at the first page holding fewer than **page_size**
+        summaries. Up to **concurrency** requests past the end may be
+        made before that page is seen.
+
+        .. code-block:: python
+
+            for summary in my_ndex.iter_all_user_network_summaries(username):
+                print(summary['externalId'])
+
+        :param username: the username of the network owner
+        :type username: str
+        :param page_size: number of summaries to get per request
+        :type page_size: int
+        :param concurrency: number of pages requested ahead
+        :type concurrency: int
+        :return: generator of network summaries
+        :rtype: generator
+        """
+        # resolve the user once instead of in every thread
+        self._get_user_external_id(username)
+        workers = max(1, min(concurrency, self.pool_size))
+        offsets = itertools.count(0, page_size)
+        pending = deque()
+        executor = ThreadPoolExecutor(max_workers=workers)
+
+        def submit_next():
+            pending.append(executor.submit(self.get_user_network_summaries,
+                                           username, offset=next(offsets),
+                                           limit=page_size))
+        try:
+            for _ in range(workers):
+                submit_next()
+            while True:
+                page = pending.popleft().result() or []
+                # keep the window full before handing the page over
+                submit_next()
+                for summary in page:
+                    yield summary
+                if len(page) < page_size:
+                    return
+        finally:
+            # drop pages not started yet, also when the caller stops early
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def _get_user_network_summaries_stream(self, username, offset, limit):
+        """
+        Requests the network summaries for **username** without reading
+        the body
+
+        :return: streamed response or empty string if there is no content
+        """
+        user_id = self._get_user_external_id(username)
+        route = self._routes['user_network_summaries'] % user_id
+        return self.get_stream(route, get_params={'offset': offset,
+                                                  'limit': limit})
 
     def get_network_ids_for_user(self, username):
         """
@@ -1490,9 +2260,14 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
         :type username: str
         :return: list of uuids
         """
-        network_summaries_list = self.get_network_summaries_for_user(username)
-
-        return self.network_summaries_to_ids(network_summaries_list)
+        network_summaries = self._get_user_network_summaries_stream(username,
+                                                                    0, 1000)
+        if not network_summaries:
+            return []
+        # only the ids are built as the response is read, the rest of
+        # each summary is skipped instead of being turned into a dict
+        network_summaries.raw.decode_content = True
+        return list(ijson.items(network_summaries.raw, 'item.externalId'))
 
     def grant_network_to_user_by_username(self, username, network_id, permission):
         """
@@ -1518,10 +2293,11 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
         :return: Result
         :rtype: dict
         """
-        user = self.get_user_by_username(username).json
-        self.update_network_user_permission(user["externalid"], network_id, permission)
+        user_id = self._get_user_external_id(username)
+        return self.update_network_user_permission(user_id, network_id, permission)
 
-    def grant_networks_to_user(self, userid, networkids, permission="READ"):
+    def grant_networks_to_user(self, userid, networkids, permission="READ",
+                               concurrency=8):
         """
         Gives read permission to specified networks for the provided user
 
@@ -1542,11 +2318,15 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
         :type networkids: list of strings
         :param permission: Network permissions
         :type permission: string (default is READ)
-        :return: none
-        :rtype: none
+        :param concurrency: Maximum number of networks updated at the same time
+        :type concurrency: int
+        :return: Result, or exception raised, of each update keyed by
+                 network id, see :py:func:`_bulk_update_permissions`
+        :rtype: dict
         """
-        for networkid in networkids:
-            self.update_network_user_permission(userid, networkid, permission)
+        return self._bulk_update_permissions(self.update_network_user_permission,
+                                             userid, networkids, permission,
+                                             concurrency=concurrency)
 
     def update_status(self):
         """
@@ -1576,7 +2356,7 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
         :rtype:
         """
         route = "/admin/status"
-        self.status = self.get(route)
+        self.status = self._get_json(route)
 
     def create_networkset(self, name, description):
         """
@@ -1610,9 +2390,9 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
         :rtype: string
         """
         route = '/networkset'
-        return self.post(route, json.dumps({"name": name, "description": description}))
+        return self.post(route, _dumps({"name": name, "description": description}))
 
-    def get_network_set(self, set_id):
+    def get_network_set(self, set_id, cache=True):
         """
         Gets the network set information including the list of networks
 	
@@ -1635,12 +2415,15 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
 				
         :param set_id: network set id
         :type set_id: basestring
+        :param cache: If False, the read cache is bypassed, see
+                      **cache_ttl** in the constructor
+        :type cache: bool
         :return: network set information
         :rtype: dict
         """
         route = '/networkset/%s' % set_id
 
-        return self.get(route)
+        return self._cached_get(route, network_id=set_id, cache=cache)
 
     def add_networks_to_networkset(self, set_id, networks):
         """
@@ -1662,7 +2445,9 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
 
         :param set_id: network set id
         :type set_id: basestring
-        :param networks: networks that will be added to the set
+        :param networks: networks that will be added to the set. Lists
+                         longer than :py:attr:`STREAM_CHUNK_SIZE` and
+                         other iterables are streamed to the server
         :type networks: list of strings
         :return: None
         :rtype: None
@@ -1670,10 +2455,18 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
 
         route = '/networkset/%s/members' % set_id
 
-        post_json = json.dumps(networks)
-        return self.post(route, post_json)
+        chunk = Ndex2.STREAM_CHUNK_SIZE
+        if isinstance(networks, (list, tuple)) and len(networks) <= chunk:
+            post_json = _dumps(networks)
+        else:
+            post_json = _iter_json_array(networks, chunk=chunk)
+        res = self.post(route, post_json)
+        self.invalidate(set_id)
+        return res
 
-    def delete_networks_from_networkset(self, set_id, networks, retry=5):
+    def delete_networks_from_networkset(self, set_id, networks, retry=5,
+                                        base_delay=0.1, max_delay=10,
+                                        jitter=0.5):
         """
         Removes network(s) from a network set.
 	
@@ -1708,32 +2501,45 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
         :type networks: list of strings
         :param retry: Number of times to retry
         :type retry: int
+        :param base_delay: Seconds to wait before the first retry, doubled
+                           for each retry after that, see :py:func:`_backoff_delay`
+        :type base_delay: float
+        :param max_delay: Most seconds to wait between retries
+        :type max_delay: float
+        :param jitter: Largest fraction of the delay randomly added to it
+        :type jitter: float
+        :raises NDExConcurrentModificationError: If the set is still
+                                                 locked after **retry** tries
         :return: None
         :rtype: None
         """
 
         route = '/networkset/%s/members' % set_id
-        post_json = json.dumps(networks)
-        headers = self.s.headers
-        headers['Content-Type'] = 'application/json;charset=UTF-8'
-        headers['Accept'] = 'application/json'
-        headers['User-Agent'] = userAgent + self.user_agent
+        post_json = _dumps(networks)
 
+        delete = self.delete
+        logger = self.logger
         count = 0
         while count < retry:
             try:
-                return self.delete(route, data=post_json)
-            except Exception as inst:
-                d = json.loads(inst.response.content)
-                if d.get('errorCode').startswith("NDEx_Concurrent_Modification"):
-                    self.logger.debug("retry deleting network in 1 second(" + str(count) + ")")
-                    count += 1
-                    time.sleep(1)
-                else:
-                    raise inst
-        raise Exception("Network is locked after " + str(retry) + " retry.")
-
-    def get_sample_network(self, network_id):
+                res = delete(route, data=post_json)
+                self.invalidate(set_id)
+                return res
+            except req_except.HTTPError as inst:
+                if not _is_concurrent_modification(inst):
+                    raise
+                count += 1
+                if count < retry:
+                    delay = _backoff_delay(count - 1, base_delay=base_delay,
+                                           max_delay=max_delay,
+                                           jitter=jitter)
+                    logger.debug("retry deleting network in %.3f "
+                                 "seconds(%s)", delay, count)
+                    time.sleep(delay)
+        raise NDExConcurrentModificationError("Network is locked after " +
+                                              str(retry) + " retry.")
+
+    def get_sample_network(self, network_id, cache=True):
         """
         Gets the sample network
 
@@ -1750,22 +2556,350 @@ m		y_ndex=ndex2.client.Ndex2("http://public.ndexbio.org", my_account, my_passwor
 
         :param network_id: Network id
         :type network_id: string
+        :param cache: If False, the read cache is bypassed, see
+                      **cache_ttl** in the constructor
+        :type cache: bool
         :raises NDExUnauthorizedError: If credentials are invalid or not set
         :return: Sample network
         :rtype: list of dicts in cx format
         """
         route = "/network/%s/sample" % network_id
-        return self.get(route)
+        return self._cached_get(route, network_id=network_id, cache=cache)
+
+
+def _is_concurrent_modification(exc):
+    """
+    Tells if **exc** is the 409 response the server sends while a network
+    or network set is locked by another change. The body is only parsed
+    for the error code once the status matches.
+
+    :param exc: error raised for the response
+    :type exc: :py:class:`requests.exceptions.HTTPError`
+    :return: True if the request can be retried
+    :rtype: bool
+    """
+    response = getattr(exc, 'response', None)
+    if response is None or response.status_code != 409:
+        return False
+    try:
+        code = _loads(response.content).get('errorCode') or ''
+    except (ValueError, AttributeError, TypeError):
+        return False
+    return code.startswith('NDEx_Concurrent_Modification')
 
 
+def _backoff_delay(attempt, base_delay=0.05, max_delay=2.0, jitter=None):
+    """
+    Seconds to wait before retry number **attempt** (starting at 0),
+    doubling each attempt up to **max_delay**. Random jitter is added
+    so clients that hit the same conflict do not all retry at the same
+    moment: up to **jitter** times the delay, or up to **base_delay**
+    when **jitter** is None.
+
+    :param attempt: number of attempts already retried
+    :type attempt: int
+    :param base_delay: delay before the first retry
+    :type base_delay: float
+    :param max_delay: cap on the delay before jitter
+    :type max_delay: float
+    :param jitter: largest fraction of the delay added to it
+    :type jitter: float
+    :return: delay in seconds
+    :rtype: float
+    """
+    delay = min(max_delay, base_delay * 2 ** attempt)
+    if jitter is None:
+        return delay + random.uniform(0, base_delay)
+    return delay * (1 + random.random() * jitter)
+
+
+def _params_key(params):
+    """
+    Hashable form of query **params**, the same whatever
+    order the dict was built in
+
+    :param params: query parameters
+    :type params: dict
+    :return: sorted parameter items or None if there are none
+    :rtype: tuple
+    """
+    if not params:
+        return None
+    return tuple(sorted(params.items()))
+
+
+class _PrecomputedBasicAuth(AuthBase):
+    """
+    HTTP Basic auth whose Authorization header is encoded once, instead
+    of on every request as :py:class:`requests.auth.HTTPBasicAuth` does.
+    Credentials are encoded as latin1, same as requests.
+    """
+    def __init__(self, username, password):
+        self.username = username
+        self.password = password
+        if isinstance(username, str):
+            username = username.encode('latin1')
+        if isinstance(password, str):
+            password = password.encode('latin1')
+        token = base64.b64encode(b':'.join((username, password)))
+        self._header = 'Basic ' + token.decode('ascii')
+
+    def __eq__(self, other):
+        return (self.username, self.password) == \
+            (getattr(other, 'username', None), getattr(other, 'password', None))
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __call__(self, r):
+        r.headers['Authorization'] = self._header
+        return r
+
+
+class _TTLCache(object):
+    """
+    Thread safe mapping whose entries expire **ttl** seconds after they
+    are set. Once **maxsize** entries are held the oldest is dropped.
+    """
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        :return: value set for **key** or None if it is missing or expired
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if time.monotonic() >= expires:
+                del self._data[key]
+                return None
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop_matching(self, predicate):
+        """
+        Removes the entries whose key **predicate** returns True for
+        """
+        with self._lock:
+            for key in [k for k in self._data if predicate(k)]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class _CXBytesStream(object):
+    """
+    Read only file like object holding CX serialized to UTF-8 JSON, for
+    use as a :py:class:`~requests_toolbelt.MultipartEncoder` field.
+
+    Each aspect is encoded separately so the document is never held as
+    one large str plus a bytes copy of it, and chunks are released as
+    they are read. The encoder needs the length up front so the
+    document is still encoded before the upload starts.
+    """
+    def __init__(self, cx):
+        chunks = deque([b'['])
+        for aspect in cx:
+            if len(chunks) > 1:
+                chunks.append(b',')
+            chunks.append(_dumps(aspect))
+        chunks.append(b']')
+        self._chunks = chunks
+        self._offset = 0
+        # remaining bytes, which is what MultipartEncoder expects
+        self.len = sum(len(c) for c in chunks)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self.len
+        pieces = []
+        while size > 0 and self._chunks:
+            chunk = self._chunks[0]
+            piece = chunk[self._offset:self._offset + size]
+            pieces.append(piece)
+            size -= len(piece)
+            self._offset += len(piece)
+            if self._offset >= len(chunk):
+                self._chunks.popleft()
+                self._offset = 0
+        data = b''.join(pieces)
+        self.len -= len(data)
+        return data
+
+
+def _loaded_numpy():
+    """
+    Gets numpy only if it has already been imported. A numpy value
+    cannot exist before that, so the client never needs to pay for
+    importing numpy itself
+
+    :return: numpy module or None
+    """
+    return sys.modules.get('numpy')
+
+
+def _bytes_to_str(o):
+    return o.decode('ascii')
+
+
+# converters used by DecimalEncoder keyed on the exact type of the value,
+# other types are matched once by isinstance in _decimal_encoder_converter()
+# and added here, so each value costs a single dict lookup
+_DECIMAL_ENCODER_CONVERTERS = {decimal.Decimal: float,
+                               bytes: _bytes_to_str}
+
+
+def _decimal_encoder_converter(o):
+    """
+    Gets the function :py:class:`DecimalEncoder` converts **o** with
+
+    :param o: value the json module cannot serialize
+    :return: converter or None if **o** is not supported
+    :rtype: callable
+    """
+    kind = type(o)
+    converter = _DECIMAL_ENCODER_CONVERTERS.get(kind)
+    if converter is not None:
+        return converter
+    numpy = _loaded_numpy()
+    if isinstance(o, decimal.Decimal):
+        converter = float
+    elif numpy is not None and isinstance(o, numpy.integer):
+        converter = int
+    elif isinstance(o, bytes):
+        converter = _bytes_to_str
+    else:
+        return None
+    _DECIMAL_ENCODER_CONVERTERS[kind] = converter
+    return converter
+
 
 class DecimalEncoder(json.JSONEncoder):
     def default(self, o):
-        if isinstance(o, decimal.Decimal):
-            return float(o)
-        elif isinstance(o, numpy.integer):
-            return int(o)
-        elif isinstance(o, bytes):
-            bytes_string = o.decode('ascii')
-            return bytes_string
-        return super(DecimalEncoder, self).encode(o)
+        converter = _decimal_encoder_converter(o)
+        if converter is not None:
+            return converter(o)
+        return super(DecimalEncoder, self).default(o)
+
+
+def _cx_default(o):
+    """
+    Converts values JSON cannot represent natively, same
+    conversions :py:class:`DecimalEncoder` does plus any numpy scalar
+    """
+    if isinstance(o, decimal.Decimal):
+        return float(o)
+    numpy = _loaded_numpy()
+    if numpy is not None and isinstance(o, numpy.generic):
+        return o.item()
+    if isinstance(o, bytes):
+        return o.decode('ascii')
+    raise TypeError('Type is not JSON serializable: %s' % type(o).__name__)
+
+
+def _dumps(o):
+    """
+    Serializes **o** to UTF-8 encoded JSON bytes, using orjson
+    when it is installed and the stdlib json module otherwise
+
+    :param o: object to serialize
+    :return: JSON
+    :rtype: bytes
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(o, default=_cx_default,
+                                option=orjson.OPT_SERIALIZE_NUMPY)
+        except TypeError:
+            # orjson is stricter than json, ie non str dict keys
+            # or integers over 64 bits, fall back for those
+            pass
+    return json.dumps(o, default=_cx_default).encode('utf-8')
+
+
+def _iter_json_array(items, chunk=1024):
+    """
+    Encodes **items** as a JSON array a few elements at a time, so
+    the whole document never has to be held in memory. requests sends
+    a generator like this one with chunked transfer encoding
+
+    :param items: elements of the array
+    :type items: iterable
+    :param chunk: elements encoded per yielded piece
+    :type chunk: int
+    :return: pieces of the JSON array
+    :rtype: generator of bytes
+    """
+    buf = []
+    sep = b'['
+    for item in items:
+        buf.append(_dumps(item))
+        if len(buf) >= chunk:
+            yield sep + b','.join(buf)
+            buf = []
+            sep = b','
+    if buf:
+        yield sep + b','.join(buf)
+    elif sep == b'[':
+        yield sep
+    yield b']'
+
+
+@functools.singledispatch
+def _as_json_body(obj, name='body'):
+    """
+    Gets the request body for **obj**. dict and list objects are
+    serialized straight to UTF-8 bytes with :py:func:`_dumps`, so
+    requests has nothing left to encode, while str and bytes are
+    assumed to already be JSON and are returned as is
+
+    :param obj: body to send
+    :type obj: dict, list, str or bytes
+    :param name: name of the parameter, used in the error message
+    :type name: str
+    :raises NDExError: if **obj** is not one of the types above
+    :return: JSON
+    :rtype: str or bytes
+    """
+    raise NDExError('%s must be a string, a dict or a list, not %s' %
+                    (name, type(obj).__name__))
+
+
+@_as_json_body.register(dict)
+@_as_json_body.register(list)
+def _(obj, name='body'):
+    return _dumps(obj)
+
+
+@_as_json_body.register(str)
+@_as_json_body.register(bytes)
+def _(obj, name='body'):
+    return obj
+
+
+def _loads(data):
+    """
+    Parses JSON **data** with orjson when it is installed
+    and the stdlib json module otherwise
+
+    :param data: JSON document
+    :type data: bytes or str
+    :return: parsed JSON
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -21,3 +21,11 @@ class NDExInvalidCXError(NDExError):
     Raised due to invalid CX
     """
     pass
+
+
+class NDExConcurrentModificationError(NDExError):
+    """
+    Raised when a change keeps failing because the server reports
+    the network or network set is being modified by another request
+    """
+    pass
@@ -16,10 +16,7 @@ from ndex2.client import Ndex2
 from ndex2.exceptions import NDExError
 from ndex2 import constants
 
-if sys.version_info.major == 3:
-    from urllib.request import urlopen, Request, HTTPError, URLError
-else:
-    from urllib2 import urlopen, Request, HTTPError, URLError
+from urllib.request import urlopen, Request, HTTPError, URLError
 
 
 class NiceCXNetwork():
@@ -30,6 +27,9 @@ class NiceCXNetwork():
     PROPS_OF_NODES = 'nodes'
     PROPS_OF_EDGES = 'edges'
 
+    # seconds get_aspect() waits on the server
+    ASPECT_TIMEOUT = 30
+
     def __init__(self, **attr):
 
         self.metadata = {}
@@ -55,6 +55,7 @@ class NiceCXNetwork():
         self.opaqueAspects = {}
         self.provenance = []
         self.missingNodes = {}
+        # session of the aspect requests, see _get_aspect_session()
         self.s = None
         self.node_name_to_id_map_cache = {}
         self.logger = logging.getLogger(__name__)
@@ -498,13 +499,12 @@ class NiceCXNetwork():
         if name is None or values is None:
             raise NDExError('Node attribute requires the name and values property')
 
-        if self.nodeAttributes.get(node_id) is None:
-            self.nodeAttributes[node_id] = []
+        node_attributes = self.nodeAttributes.setdefault(node_id, [])
 
         if overwrite is True:
-            for index, val in enumerate(self.nodeAttributes[node_id]):
+            for index, val in enumerate(node_attributes):
                 if val[constants.NODE_ATTR_NAME] == name:
-                    del self.nodeAttributes[node_id][index]
+                    del node_attributes[index]
 
         n_attrib = {constants.NODE_ATTR_PROPERTYOF: node_id,
                     constants.NODE_ATTR_NAME: name,
@@ -523,7 +523,7 @@ class NiceCXNetwork():
         else:
             n_attrib[constants.NODE_ATTR_DATATYPE] = type
 
-        self.nodeAttributes[node_id].append(n_attrib)
+        node_attributes.append(n_attrib)
 
     def add_edge_attribute(self, property_of, name, values, type=None, subnetwork=None):
         if isinstance(property_of, dict):
@@ -535,16 +535,15 @@ class NiceCXNetwork():
         #if name is None or values is None:
         #    raise Exception('Edge attribute requires the name and values property')
 
-        if self.edgeAttributes.get(property_of) is None :
-            self.edgeAttributes[property_of] = []
+        edge_attributes = self.edgeAttributes.setdefault(property_of, [])
 
         if type is None:
-            self.edgeAttributes[property_of].append({'po': property_of, 'n': name, 'v': values})
+            edge_attributes.append({'po': property_of, 'n': name, 'v': values})
         else:
             #TODO check for float --> double and numpy types
             if type == 'float' or type == 'list_of_float':
                 type = 'float'
-            self.edgeAttributes[property_of].append({'po': property_of, 'n': name, 'v': values, 'd': type})
+            edge_attributes.append({'po': property_of, 'n': name, 'v': values, 'd': type})
 
     def get_nodes(self):
         """
@@ -2213,6 +2212,33 @@ class NiceCXNetwork():
         elif aspect_name == 'supports':
             return self.supports
 
+    def _get_aspect_session(self):
+        """
+        Gets the session get_stream() and stream_aspect() send their
+        requests with, created on first use. It belongs to this network,
+        so loading it one aspect at a time reuses one connection while
+        cookies are never shared with other networks
+
+        :return: session of this network
+        :rtype: :py:class:`requests.Session`
+        """
+        if self.s is None:
+            self.s = requests.Session()
+        return self.s
+
+    def close(self):
+        """
+        Closes the connections opened by :py:func:`get_aspect`, if any.
+        The network itself is left as is and a later
+        :py:func:`get_aspect` opens a new session
+
+        :return: None
+        :rtype: None
+        """
+        if self.s is not None:
+            self.s.close()
+            self.s = None
+
     def get_aspect(self, uuid, aspect_name, server, username, password, stream=False):
         if stream:
             return self.stream_aspect(uuid, aspect_name, server, username, password)
@@ -2224,20 +2250,21 @@ class NiceCXNetwork():
         if 'http' not in server:
             server = 'http://' + server
 
-        s = requests.session()
+        auth = None
         if username and password:
-            # add credentials to the session, if available
-            s.auth = (username, password)
+            # add credentials to the request, if available
+            auth = (username, password)
 
+        session = self._get_aspect_session()
         if aspect_name == 'metaData':
-            md_response = s.get(server + '/v2/network/' + uuid + '/aspect')
+            md_response = session.get(server + '/v2/network/' + uuid + '/aspect',
+                                      auth=auth, timeout=NiceCXNetwork.ASPECT_TIMEOUT)
             json_response = md_response.json()
-            s.close()
             return json_response.get('metaData')
         else:
-            aspect_response = s.get(server + '/v2/network/' + uuid + '/aspect/' + aspect_name)
+            aspect_response = session.get(server + '/v2/network/' + uuid + '/aspect/' + aspect_name,
+                                          auth=auth, timeout=NiceCXNetwork.ASPECT_TIMEOUT)
             json_response = aspect_response.json()
-            s.close()
             return json_response
 
     def stream_aspect(self, uuid, aspect_name, server, username, password):
@@ -2246,22 +2273,22 @@ class NiceCXNetwork():
         if aspect_name == 'metaData':
             print(server + '/v2/network/' + uuid + '/aspect')
 
-            s = requests.session()
+            auth = None
             if username and password:
-                # add credentials to the session, if available
-                s.auth = (username, password)
-            md_response = s.get(server + '/v2/network/' + uuid + '/aspect')
+                # add credentials to the request, if available
+                auth = (username, password)
+            md_response = self._get_aspect_session().get(server + '/v2/network/' + uuid + '/aspect',
+                                                         auth=auth, timeout=NiceCXNetwork.ASPECT_TIMEOUT)
             json_response = md_response.json()
-            s.close()
             return json_response.get('metaData')
         else:
             if username and password:
                 #base64string = base64.b64encode('%s:%s' % (username, password))
-                request = Request(server + '/v2/network/' + uuid + '/aspect/' + aspect_name, headers={"Authorization": "Basic " + base64.encodestring(username + ':' + password).replace('\n', '')})
+                request = Request(server + '/v2/network/' + uuid + '/aspect/' + aspect_name, headers={"Authorization": "Basic " + base64.b64encode((username + ':' + password).encode()).decode('ascii')})
             else:
                 request = Request(server + '/v2/network/' + uuid + '/aspect/' + aspect_name)
             try:
-                urlopen_result = urlopen(request) #'http://dev2.ndexbio.org/v2/network/' + uuid + '/aspect/' + aspect_name)
+                urlopen_result = urlopen(request, timeout=NiceCXNetwork.ASPECT_TIMEOUT) #'http://dev2.ndexbio.org/v2/network/' + uuid + '/aspect/' + aspect_name)
             except HTTPError as e:
                 print(e.code)
                 return []
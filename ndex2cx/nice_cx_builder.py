@@ -1,56 +1,66 @@
 __author__ = 'aarongary'
 
 import json
-import ijson
+# bind the C yajl parser when it is available, ijson 2.x otherwise
+# defaults to its much slower pure python backend
+try:
+    import ijson.backends.yajl2_c as ijson
+except ImportError:
+    try:
+        import ijson.backends.yajl2_cffi as ijson
+    except ImportError:
+        import ijson
 import requests
 import base64
-import sys
+import itertools
 import math
 import numpy as np
 
-if sys.version_info.major == 3:
-    from urllib.request import urlopen, Request, HTTPBasicAuthHandler, HTTPPasswordMgrWithDefaultRealm, \
-        build_opener, install_opener, HTTPError, URLError
-else:
-    from urllib2 import urlopen, Request, HTTPBasicAuthHandler, HTTPPasswordMgrWithDefaultRealm, \
-        build_opener, install_opener, HTTPError, URLError
-
 
 class NiceCXBuilder(object):
+
+    # seconds the aspect streams wait on the server
+    TIMEOUT = 30
+
     def __init__(self, cx=None, server=None, username='scratch', password='scratch', uuid=None, networkx_G=None, data=None, **attr):
         from ndex2.nice_cx_network import NiceCXNetwork
+        from ndex2.client import _PrecomputedBasicAuth
 
         self.nice_cx = NiceCXNetwork(user_agent='niceCx Builder')
         self.node_id_lookup = {}
         self.node_id_counter = 0
         self.edge_id_counter = 0
 
-        self.node_inventory = {}
-        self.node_attribute_inventory = []
+        # nodes, edges and their attributes are stored straight into
+        # self.nice_cx as they are added, these only track duplicates;
+        # node names map to their id, the node itself is in nice_cx.nodes
+        self.node_name_to_id = {}
         self.node_attribute_map = {}
-
-        self.edge_inventory = {}
-        self.edge_attribute_inventory = []
         self.edge_attribute_map = {}
 
-        self.opaque_aspect_inventory = []
+        # opaque aspect name to its elements, a later aspect
+        # with the same name replaces the earlier one
+        self.opaque_aspect_inventory = {}
 
         self.context_inventory = []
 
         self.network_attribute_inventory = {}
 
+        # CX files parsed by load_aspect, by file name
+        self._aspect_cache = {}
+
         self.user_base64 = None
         self.username = None
         self.password = None
+        self._auth = None
+        # session of the aspect streams, see _get_session()
+        self._session = None
         if username and password:
             self.username = username
             self.password = password
-            if sys.version_info.major == 3:
-                encode_string = '%s:%s' % (username, password)
-                byte_string = encode_string.encode()
-                self.user_base64 = base64.b64encode(byte_string)#.replace('\n', '')
-            else:
-                self.user_base64 = base64.encodestring('%s:%s' % (username, password)).replace('\n', '')
+            # Authorization header sent with the aspect streams, encoded once
+            self._auth = _PrecomputedBasicAuth(username, password)
+            self.user_base64 = base64.b64encode(('%s:%s' % (username, password)).encode())
 
     def set_context(self, context):
         """
@@ -116,8 +126,9 @@ class NiceCXBuilder(object):
         :return: Node ID
         :rtype: int
         """
-        if self.node_inventory.get(name) is not None:
-            return self.node_inventory.get(name).get('@id')
+        existing = self.node_name_to_id.get(name)
+        if existing is not None:
+            return existing
 
         if id:
             node_id = id
@@ -131,13 +142,79 @@ class NiceCXBuilder(object):
         if data_type:
             add_this_node['d'] = data_type
 
-        self.node_inventory[name] = add_this_node
+        self.node_name_to_id[name] = node_id
+        self.nice_cx.nodes[node_id] = add_this_node
 
         if map_node_ids:
             self.node_id_lookup[name] = node_id
 
         return node_id
 
+    def add_nodes(self, names, represents=None):
+        """
+        Adds many nodes at once, the bulk version of :py:meth:`add_node`
+        for importers building large networks. Like :py:meth:`add_node`,
+        a name that was already added gets back its existing id.
+
+        :param names: Names of the nodes
+        :type names: iterable of str
+        :param represents: Representation of each node, in the same
+                           order as **names**
+        :type represents: iterable of str
+        :raises ValueError: If **represents** and **names** differ in
+                            length
+        :return: Node ID of each name
+        :rtype: list of int
+        """
+        if represents is None:
+            represents = itertools.repeat(None)
+        else:
+            names = list(names)
+            represents = list(represents)
+            if len(names) != len(represents):
+                raise ValueError('Got %d names but %d represents'
+                                 % (len(names), len(represents)))
+
+        name_to_id = self.node_name_to_id
+        nodes = self.nice_cx.nodes
+        next_id = self.node_id_counter
+        node_ids = []
+        for name, node_represents in zip(names, represents):
+            node_id = name_to_id.get(name)
+            if node_id is None:
+                node_id = next_id
+                next_id += 1
+                add_this_node = {'@id': node_id, 'n': name}
+                if node_represents:
+                    add_this_node['r'] = node_represents
+                nodes[node_id] = add_this_node
+                name_to_id[name] = node_id
+            node_ids.append(node_id)
+
+        self.node_id_counter = next_id
+        return node_ids
+
+    def add_edges(self, edges):
+        """
+        Adds many edges at once, the bulk version of :py:meth:`add_edge`.
+        Each edge is a (source, target) or (source, target, interaction)
+        tuple of node ids, the interaction defaults to interacts-with.
+
+        :param edges: Edges to add
+        :type edges: iterable of tuple
+        :return: Edge ID of each edge
+        :rtype: list of int
+        """
+        start = self.edge_id_counter
+        add_these_edges = {}
+        for edge_id, edge in enumerate(edges, start):
+            add_these_edges[edge_id] = {'@id': edge_id, 's': edge[0], 't': edge[1],
+                                        'i': edge[2] if len(edge) > 2 and edge[2] else 'interacts-with'}
+
+        self.nice_cx.edges.update(add_these_edges)
+        self.edge_id_counter = start + len(add_these_edges)
+        return list(range(start, self.edge_id_counter))
+
     def add_edge(self, source=None, target=None, interaction=None, id=None):
         """
         Adds a new edge in the network by specifying source-interaction-target
@@ -166,7 +243,7 @@ class NiceCXBuilder(object):
         else:
             add_this_edge['i'] = 'interacts-with'
 
-        self.edge_inventory[edge_id] = add_this_edge
+        self.nice_cx.edges[edge_id] = add_this_edge
 
         return edge_id
 
@@ -231,7 +308,7 @@ class NiceCXBuilder(object):
             add_this_node_attribute['d'] = attr_type
 
         if add_this_node_attribute['v'] is not None:
-            self.node_attribute_inventory.append(add_this_node_attribute)
+            self.nice_cx.nodeAttributes.setdefault(property_of, []).append(add_this_node_attribute)
             self.node_attribute_map[property_of][name] = True
 
     def add_edge_attribute(self, property_of=None, name=None, values=None, type=None):
@@ -298,11 +375,11 @@ class NiceCXBuilder(object):
             add_this_edge_attribute['d'] = attr_type
 
         if add_this_edge_attribute['v'] is not None:
-            self.edge_attribute_inventory.append(add_this_edge_attribute)
+            self.nice_cx.edgeAttributes.setdefault(property_of, []).append(add_this_edge_attribute)
             self.edge_attribute_map[property_of][name] = True
 
     def add_opaque_aspect(self, oa_name, oa_list):
-        self.opaque_aspect_inventory.append({oa_name: oa_list})
+        self.opaque_aspect_inventory[oa_name] = oa_list
 
     #===================================
     # methods to add data by fragment
@@ -317,16 +394,10 @@ class NiceCXBuilder(object):
         self.nice_cx.edges[fragment.get('@id')] = fragment
 
     def _add_node_attribute_from_fragment(self, fragment):
-        if self.nice_cx.nodeAttributes.get(fragment.get('po')) is None:
-            self.nice_cx.nodeAttributes[fragment.get('po')] = []
-
-        self.nice_cx.nodeAttributes[fragment.get('po')].append(fragment)
+        self.nice_cx.nodeAttributes.setdefault(fragment.get('po'), []).append(fragment)
 
     def _add_edge_attribute_from_fragment(self, fragment):
-        if self.nice_cx.edgeAttributes.get(fragment.get('po')) is None:
-            self.nice_cx.edgeAttributes[fragment.get('po')] = []
-
-        self.nice_cx.edgeAttributes[fragment.get('po')].append(fragment)
+        self.nice_cx.edgeAttributes.setdefault(fragment.get('po'), []).append(fragment)
 
     def _add_citation_from_fragment(self, fragment):
         self.nice_cx.citations[fragment.get('@id')] = fragment
@@ -360,123 +431,154 @@ class NiceCXBuilder(object):
         # ASSEMBLE NETWORK ATTRIBUTES
         #=============================
         #{'n': 'name', 'v': network_name, 'd': 'string'}
-        for k, v in self.network_attribute_inventory.items():
-            self.nice_cx.add_network_attribute(name=v.get('n'), values=v.get('v'), type=v.get('d'))
-
-        #==========================
-        # ASSEMBLE NODES
-        #==========================
-        for k, v in self.node_inventory.items():
-            self.nice_cx.nodes[v.get('@id')] = v
-
-        #==========================
-        # ASSEMBLE NODE ATTRIBUTES
-        #==========================
-        for a in self.node_attribute_inventory:
-            property_of = a.get('po')
-
-            if self.nice_cx.nodeAttributes.get(property_of) is None:
-                self.nice_cx.nodeAttributes[property_of] = []
-
-            self.nice_cx.nodeAttributes[property_of].append(a)
-
-        #==========================
-        # ASSEMBLE EDGES
-        #==========================
-        for k, v in self.edge_inventory.items():
-            self.nice_cx.edges[k] = v
-
-        #==========================
-        # ASSEMBLE EDGE ATTRIBUTES
-        #==========================
-        for a in self.edge_attribute_inventory:
-            property_of = a.get('po')
-
-            if self.nice_cx.edgeAttributes.get(property_of) is None:
-                self.nice_cx.edgeAttributes[property_of] = []
+        if not self.nice_cx.networkAttributes:
+            # the inventory already holds the finished elements, one per
+            # name, so they can go in as they are
+            self.nice_cx.networkAttributes.extend(self.network_attribute_inventory.values())
+        else:
+            # merge with attributes added from CX fragments
+            for k, v in self.network_attribute_inventory.items():
+                self.nice_cx.add_network_attribute(name=v.get('n'), values=v.get('v'), type=v.get('d'))
 
-            self.nice_cx.edgeAttributes[property_of].append(a)
+        # nodes, edges and their attributes were already added
+        # to self.nice_cx by add_node(), add_edge() and friends
 
         #==========================
         # ASSEMBLE OPAQUE ASPECTS
         #==========================
-        for oa in self.opaque_aspect_inventory:
-            for k, v in oa.items():
-                self.nice_cx.add_opaque_aspect(k, v)
+        for k, v in self.opaque_aspect_inventory.items():
+            self.nice_cx.add_opaque_aspect(k, v)
 
         return self.nice_cx
 
+    def get_frags_by_key(self, cx):
+        """
+        Groups the fragments of a CX document by aspect name in one pass,
+        so each aspect can be looked up without scanning **cx** again.
+        Fragments of an aspect split across several entries are joined
+        in document order.
+
+        :param cx: a CX document, a list of aspect dicts
+        :type cx: list
+        :return: aspect name to list of its fragments
+        :rtype: dict
+        """
+        frags = {}
+        for aspect in cx:
+            for key, value in aspect.items():
+                if isinstance(value, list):
+                    frags.setdefault(key, []).extend(value)
+                else:
+                    frags.setdefault(key, []).append(value)
+
+        return frags
+
     def get_frag_from_list_by_key(self, cx, key):
+        """
+        Gets the fragments of the **key** aspect of a CX document, joined
+        in document order. Only **key** is collected, to get every aspect
+        in one pass use :py:meth:`get_frags_by_key` instead.
+
+        :param cx: a CX document, a list of aspect dicts
+        :type cx: list
+        :param key: name of the aspect, ie 'nodes'
+        :type key: str
+        :return: fragments of the aspect
+        :rtype: list
+        """
         return_list = []
         for aspect in cx:
             if key in aspect:
-                if isinstance(aspect[key], list):
-                    for a_item in aspect[key]:
-                        return_list.append(a_item)
+                value = aspect[key]
+                if isinstance(value, list):
+                    return_list.extend(value)
                 else:
-                    return_list.append(aspect[key])
+                    return_list.append(value)
 
         return return_list
 
-    def load_aspect(self, aspect_name):
-        #with open('Signal1.cx', mode='r') as cx_f:
-        with open('network1.cx', mode='r') as cx_f:
-            aspect_json = json.loads(cx_f.read())
-            for aspect in aspect_json:
-                if aspect.get(aspect_name) is not None:
-                    return aspect.get(aspect_name)
-
-    def stream_all_aspects(self, uuid):
-        return ijson.items(urlopen('http://dev2.ndexbio.org/v2/network/' + uuid), 'item')
-
-    def stream_aspect(self, uuid, aspect_name):
-        if aspect_name == 'metaData':
-            print('http://dev2.ndexbio.org/v2/network/' + uuid + '/aspect')
-            md_response = requests.get('http://dev2.ndexbio.org/v2/network/' + uuid + '/aspect')
-            json_respone = md_response.json()
-            return json_respone.get('metaData')
-        else:
-            #password_mgr = HTTPPasswordMgrWithDefaultRealm()
-
-            #top_level_url = 'http://dev2.ndexbio.org'
-            #password_mgr.add_password(None, top_level_url, self.username, self.password)
-            #handler = HTTPBasicAuthHandler(password_mgr)
-            #opener = build_opener(handler)
-            #install_opener(opener)
+    def load_aspect(self, aspect_name, filename='network1.cx'):
+        """
+        Gets the first **aspect_name** aspect of the CX file **filename**.
+        The parsed file is kept on the builder, so reading several aspects
+        from the same file only parses it once.
+
+        :param aspect_name: name of the aspect, ie 'nodes'
+        :type aspect_name: str
+        :param filename: path of the CX file
+        :type filename: str
+        :return: the aspect or None if the file does not have it
+        """
+        from ndex2.client import _loads
 
+        aspect_json = self._aspect_cache.get(filename)
+        if aspect_json is None:
+            #with open('Signal1.cx', mode='rb') as cx_f:
+            with open(filename, mode='rb') as cx_f:
+                aspect_json = _loads(cx_f.read())
+            self._aspect_cache[filename] = aspect_json
 
+        return next((aspect[aspect_name] for aspect in aspect_json
+                     if aspect.get(aspect_name) is not None), None)
 
+    def _get_session(self):
+        """
+        Gets the session of this builder's aspect streams, created on
+        first use with the builder's credentials, so fetching many
+        aspects of one network reuses a connection while cookies and
+        credentials are never shared between builders
 
+        :return: session of this builder
+        :rtype: :py:class:`requests.Session`
+        """
+        if self._session is None:
+            self._session = requests.Session()
+            self._session.auth = self._auth
+        return self._session
 
-            # Create an OpenerDirector with support for Basic HTTP Authentication...
-            #auth_handler = HTTPBasicAuthHandler()
-            #auth_handler.add_password(None, 'http://dev2.ndexbio.org', 'scratch', 'scratch')
-            #opener = build_opener(auth_handler)
-            # ...and install it globally so it can be used with urlopen.
-            #install_opener(opener)
+    def close(self):
+        """
+        Closes the connections opened by the aspect streams, if any
 
+        :return: None
+        :rtype: None
+        """
+        if self._session is not None:
+            self._session.close()
+            self._session = None
 
-            request = Request('http://dev2.ndexbio.org/v2/network/' + uuid + '/aspect/' + aspect_name)
-            base64string = base64.b64encode('%s:%s' % ('scratch', 'scratch'))
-            request.add_header("Authorization", "Basic %s" % base64string)
-            #result = urllib2.urlopen(request)
+    def _stream_raw(self, url):
+        """
+        Requests **url** over this builder's session without reading
+        the body, so ijson parses the response as it arrives
 
+        :raises requests.exceptions.HTTPError: if the server returns an error
+        :return: file like body of the response
+        """
+        response = self._get_session().get(url, stream=True,
+                                            timeout=NiceCXBuilder.TIMEOUT)
+        response.raise_for_status()
+        # let urllib3 undo any gzip/deflate encoding as ijson reads
+        response.raw.decode_content = True
+        return response.raw
 
-            urlopen_result = None
-            try:
-                urlopen_result = urlopen(request) #'http://dev2.ndexbio.org/v2/network/' + uuid + '/aspect/' + aspect_name)
-            except HTTPError as e:
-                print(e.code)
-                return []
-            except URLError as e:
-                print('Other error')
-                print('URL Error %s' % e.message())
-                return []
+    def stream_all_aspects(self, uuid):
+        return ijson.items(self._stream_raw('http://dev2.ndexbio.org/v2/network/' + uuid), 'item')
 
-            return ijson.items(urlopen_result, 'item')
+    def stream_aspect(self, uuid, aspect_name):
+        if aspect_name == 'metaData':
+            print('http://dev2.ndexbio.org/v2/network/' + uuid + '/aspect')
+            md_response = self._get_session().get('http://dev2.ndexbio.org/v2/network/' + uuid + '/aspect',
+                                                  timeout=NiceCXBuilder.TIMEOUT)
+            json_respone = md_response.json()
+            return json_respone.get('metaData')
+        else:
+            return ijson.items(self._stream_raw('http://dev2.ndexbio.org/v2/network/' + uuid +
+                                                '/aspect/' + aspect_name), 'item')
 
     def stream_aspect_raw(self, uuid, aspect_name):
-        return ijson.parse(urlopen('http://dev2.ndexbio.org/v2/network/' + uuid + '/aspect/' + aspect_name))
+        return ijson.parse(self._stream_raw('http://dev2.ndexbio.org/v2/network/' + uuid +
+                                            '/aspect/' + aspect_name))
 
     def _infer_data_type(self, val, split_string=False):
         if val is None:
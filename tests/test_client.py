@@ -4,10 +4,18 @@
 """Tests for `nbgwas_rest` package."""
 
 import sys
+import json
 import decimal
+import gzip
+import time
+import threading
 import unittest
+import io
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
 import numpy as np
 
+import requests
 import requests_mock
 from requests.exceptions import HTTPError
 from ndex2 import client
@@ -15,6 +23,8 @@ from ndex2.client import Ndex2
 from ndex2.client import DecimalEncoder
 from ndex2 import __version__
 from ndex2.exceptions import NDExInvalidCXError
+from ndex2.exceptions import NDExError
+from ndex2.exceptions import NDExConcurrentModificationError
 
 
 class TestClient(unittest.TestCase):
@@ -30,9 +40,16 @@ class TestClient(unittest.TestCase):
     def get_rest_admin_status_url(self):
         return client.DEFAULT_SERVER + '/rest/admin/status'
 
+    def get_cx_from_multipart(self, decode_txt):
+        # CX is the only field so it sits between the part
+        # headers and the closing boundary
+        start = decode_txt.index('\r\n\r\n') + 4
+        end = decode_txt.rindex('\r\n--')
+        return json.loads(decode_txt[start:end])
+
     def setUp(self):
         """Set up test fixtures, if any."""
-        pass
+        Ndex2._version_cache.clear()
 
     def tearDown(self):
         """Tear down test fixtures, if any."""
@@ -61,6 +78,77 @@ class TestClient(unittest.TestCase):
         except TypeError:
             pass
 
+        # other numpy integers are converted too
+        res = dec.default(np.uint8(7))
+        self.assertEqual(res, 7)
+        self.assertTrue(isinstance(res, int))
+
+        # unsupported types raise TypeError instead of being encoded
+        try:
+            dec.default(object())
+            self.fail('Expected TypeError')
+        except TypeError:
+            pass
+
+        self.assertEqual(json.dumps({'a': [decimal.Decimal('1.5'),
+                                           np.int16(2), b'x']},
+                                    cls=DecimalEncoder),
+                         '{"a": [1.5, 2, "x"]}')
+
+    def test_dumps(self):
+        res = client._dumps([{'d': decimal.Decimal('1.5'),
+                              'i': np.int64(3),
+                              'f': np.float32(2.5),
+                              'b': b'hi'}])
+        self.assertTrue(isinstance(res, bytes))
+        self.assertEqual(json.loads(res.decode('utf-8')),
+                         [{'d': 1.5, 'i': 3, 'f': 2.5, 'b': 'hi'}])
+
+        # non str keys and big ints are still accepted
+        res = client._dumps({1: 2**70})
+        self.assertEqual(json.loads(res.decode('utf-8')), {'1': 2**70})
+
+        try:
+            client._dumps({'x': object()})
+            self.fail('Expected TypeError')
+        except TypeError:
+            pass
+
+    def test_as_json_body(self):
+        res = client._as_json_body({'name': 'foo',
+                                    'val': decimal.Decimal('2')})
+        self.assertTrue(isinstance(res, bytes))
+        self.assertEqual(json.loads(res.decode('utf-8')),
+                         {'name': 'foo', 'val': 2})
+        res = client._as_json_body([{'name': u'caf\u00e9'}])
+        self.assertEqual(json.loads(res.decode('utf-8')),
+                         [{'name': u'caf\u00e9'}])
+        self.assertEqual(client._as_json_body('[]'), '[]')
+        self.assertEqual(client._as_json_body(b'[]'), b'[]')
+
+    def test_cxbytesstream(self):
+        cx = [{'nodes': [{'@id': 0, 'n': 'bob'}]},
+              {'edges': []},
+              {'status': [{'error': '', 'success': True}]}]
+        expected = client._dumps(cx)
+        self.assertEqual(json.loads(expected.decode('utf-8')), cx)
+
+        stream = client._CXBytesStream(cx)
+        self.assertEqual(stream.len, len(expected))
+        self.assertEqual(stream.read(), expected)
+        self.assertEqual(stream.len, 0)
+        self.assertEqual(stream.read(), b'')
+
+        # read in pieces smaller and larger than an aspect
+        for size in [1, 7, 100]:
+            stream = client._CXBytesStream(cx)
+            res = b''
+            while stream.len > 0:
+                piece = stream.read(size)
+                self.assertTrue(len(piece) <= size)
+                res += piece
+            self.assertEqual(res, expected)
+
     def test_ndex2_constructor_with_localhost(self):
 
         # this is invasive, but there isn't really a good way
@@ -98,6 +186,118 @@ class TestClient(unittest.TestCase):
         ndex = Ndex2(user_agent=None)
         self.assertEqual(ndex.user_agent, '')
 
+    def test_ndex2_constructor_mounts_pooled_adapter(self):
+        ndex = Ndex2(host='localhost', pool_size=5)
+        for prefix in ['http://', 'https://']:
+            adapter = ndex.s.get_adapter(prefix + 'foo')
+            self.assertEqual(adapter._pool_connections, Ndex2.POOL_HOSTS)
+            self.assertEqual(adapter._pool_maxsize, 5)
+            self.assertEqual(adapter.max_retries.total, 3)
+            self.assertEqual(adapter.max_retries.status_forcelist,
+                             (502, 503, 504))
+            self.assertEqual(adapter.max_retries.allowed_methods,
+                             Ndex2.RETRY_METHODS)
+
+    def _start_flaky_server(self, statuses):
+        """
+        Starts a local server answering each request with the next
+        status in **statuses**, requests_mock bypasses the adapter so
+        its retries can only be seen over a real connection. Returns the
+        url of the server and the list of (method, Content-Length,
+        bytes received) it is called with
+        """
+        seen = []
+
+        class Handler(BaseHTTPRequestHandler):
+            # a resent body that was already read is shorter than its
+            # Content-Length, stop waiting for the rest after a second
+            timeout = 1
+
+            def _answer(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = b''
+                try:
+                    while len(body) < length:
+                        chunk = self.rfile.read1(length - len(body))
+                        if not chunk:
+                            break
+                        body += chunk
+                except OSError:
+                    pass
+                seen.append((self.command, length, len(body)))
+                status = statuses.pop(0) if statuses else 204
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            do_PUT = do_DELETE = _answer
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return 'http://127.0.0.1:%d' % server.server_address[1], seen
+
+    def test_ndex2_adapter_does_not_resend_read_multipart_body(self):
+        url, seen = self._start_flaky_server([503, 204])
+        ndex = Ndex2(host=url, username='bob', password='smith',
+                     skip_version_check=True)
+        self.addCleanup(ndex.close)
+        cx_stream = io.BytesIO(b'[{"nodes": [{"@id": 0}]}]')
+        self.assertRaises(HTTPError, ndex.update_cx_network, cx_stream,
+                          'abcd')
+        # the 503 is returned, not retried with the emptied encoder
+        self.assertEqual(len(seen), 1)
+        self.assertEqual(seen[0][0], 'PUT')
+        self.assertEqual(seen[0][1], seen[0][2])
+
+    def test_ndex2_adapter_retries_delete_with_full_body(self):
+        url, seen = self._start_flaky_server([503, 204])
+        ndex = Ndex2(host=url, username='bob', password='smith',
+                     skip_version_check=True)
+        self.addCleanup(ndex.close)
+        ids = ['n1', 'n2']
+        self.assertEqual(ndex.delete_networks_from_networkset('s1', ids), '')
+        self.assertEqual(len(seen), 2)
+        body_length = len(client._dumps(ids))
+        for method, length, received in seen:
+            self.assertEqual(method, 'DELETE')
+            self.assertEqual(length, body_length)
+            self.assertEqual(received, body_length)
+
+    def test_ndex2_close_and_context_manager(self):
+        ndex = Ndex2(host='localhost')
+        closed = []
+        ndex.s.close = lambda: closed.append(True)
+        ndex.close()
+        self.assertEqual(closed, [True])
+
+        with Ndex2(host='localhost') as ndex:
+            self.assertTrue(isinstance(ndex, Ndex2))
+            ndex.s.close = lambda: closed.append(True)
+        self.assertEqual(closed, [True, True])
+
+    def test_ndex2_with_passed_in_session(self):
+        session = requests.session()
+        adapters = dict(session.adapters)
+        closed = []
+        session.close = lambda: closed.append(True)
+        one = Ndex2(host='localhost', session=session)
+        two = Ndex2(host='localhost', username='bob', password='smith',
+                    session=session)
+        self.assertTrue(one.s is session)
+        self.assertTrue(two.s is session)
+        # the caller's adapters are kept
+        self.assertEqual(session.adapters, adapters)
+        self.assertEqual(session.headers['Accept'], 'application/json')
+        self.assertEqual(session.auth.username, 'bob')
+        two.close()
+        self.assertEqual(closed, [])
+
     def test_ndex2_constructor_that_raises_httperror(self):
         with requests_mock.mock() as m:
             m.get(self.get_rest_admin_status_url(),
@@ -178,6 +378,59 @@ class TestClient(unittest.TestCase):
             self.assertEqual(ndex.host, client.DEFAULT_SERVER + '/v2')
             self.assertTrue(ndex.s is not None)
 
+    def test_ndex2_constructor_reuses_cached_server_version(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            ndex = Ndex2()
+            self.assertEqual(ndex.version, '2.1')
+            self.assertEqual(m.call_count, 1)
+            ndex = Ndex2()
+            self.assertEqual(ndex.version, '2.1')
+            self.assertEqual(ndex.host, client.DEFAULT_SERVER + '/v2')
+            self.assertEqual(m.call_count, 1)
+
+    def test_ndex2_constructor_requeries_expired_server_version(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            Ndex2()
+            version, api_host, expires = Ndex2._version_cache[client.DEFAULT_SERVER]
+            Ndex2._version_cache[client.DEFAULT_SERVER] = (version, api_host,
+                                                           expires - 1000)
+            Ndex2()
+            self.assertEqual(m.call_count, 2)
+
+    def test_ndex2_constructor_does_not_cache_httperror(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(), status_code=500)
+            ndex = Ndex2()
+            self.assertEqual(ndex.version, '1.3')
+            self.assertEqual(Ndex2._version_cache, {})
+
+    def test_ndex2_constructor_skip_version_check(self):
+        with requests_mock.mock() as m:
+            ndex = Ndex2(skip_version_check=True)
+            self.assertEqual(ndex.version, client.ASSUMED_SERVER_VERSION)
+            self.assertEqual(ndex.host, client.DEFAULT_SERVER + '/v2')
+            self.assertEqual(m.call_count, 0)
+
+    def test_ndex2_constructor_host_with_api_path(self):
+        for host in [client.DEFAULT_SERVER + '/',
+                     client.DEFAULT_SERVER + '/v2',
+                     client.DEFAULT_SERVER + '/v2/',
+                     client.DEFAULT_SERVER + '/rest']:
+            ndex = Ndex2(host=host, skip_version_check=True)
+            self.assertEqual(ndex.host, client.DEFAULT_SERVER + '/v2')
+
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            ndex = Ndex2(host=client.DEFAULT_SERVER + '/v2')
+            self.assertEqual(ndex.host, client.DEFAULT_SERVER + '/v2')
+            self.assertEqual(ndex._url('/hi'),
+                             client.DEFAULT_SERVER + '/v2/hi')
+
     def test_ndex2_require_auth(self):
         ndex = Ndex2(host='localhost')
         try:
@@ -187,6 +440,17 @@ class TestClient(unittest.TestCase):
             self.assertEqual(str(e),
                              'This method requires user authentication')
 
+    def test_ndex2_require_auth_with_credentials(self):
+        ndex = Ndex2(host='localhost', username='bob', password='smith')
+        self.assertTrue(ndex._authed)
+        ndex._require_auth()
+
+        # auth set directly on the session is still honored
+        ndex = Ndex2(host='localhost')
+        self.assertFalse(ndex._authed)
+        ndex.s.auth = ('bob', 'smith')
+        ndex._require_auth()
+
     def test_ndex2_get_user_agent(self):
         ndex = Ndex2(host='localhost')
         # try with default
@@ -198,6 +462,34 @@ class TestClient(unittest.TestCase):
         res = ndex._get_user_agent()
         self.assertEqual(res, 'NDEx2-Python/' + __version__ + ' hi')
 
+    def test_ndex2_request_headers_do_not_leak_into_session(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            m.put(client.DEFAULT_SERVER + '/v2/hi', status_code=204)
+            m.get(client.DEFAULT_SERVER + '/v2/hi', status_code=204)
+            m.delete(client.DEFAULT_SERVER + '/v2/hi', status_code=204)
+            ndex = Ndex2(user_agent='hi')
+            session_headers = dict(ndex.s.headers)
+            ndex.put('/hi', put_json='{}')
+            self.assertEqual(m.last_request.headers['Content-Type'],
+                             'application/json;charset=UTF-8')
+            ndex.get('/hi')
+            self.assertTrue('Content-Type' not in m.last_request.headers)
+            self.assertEqual(m.last_request.headers['Connection'],
+                             'keep-alive')
+            self.assertEqual(m.last_request.headers['User-Agent'],
+                             client.userAgent + ' hi')
+            self.assertEqual(m.last_request.headers['Accept'],
+                             'application/json')
+            ndex.delete('/hi', data='[]')
+            self.assertEqual(m.last_request.headers['Content-Type'],
+                             'application/json;charset=UTF-8')
+            self.assertEqual(dict(ndex.s.headers), session_headers)
+            # the shared per request headers are left untouched too
+            self.assertEqual(client._JSON_UTF8_HEADERS,
+                             {'Content-Type': 'application/json;charset=UTF-8'})
+
     def test_ndex2_put_no_json_empty_resp_code_204(self):
         with requests_mock.mock() as m:
             m.get(self.get_rest_admin_status_url(),
@@ -349,7 +641,7 @@ class TestClient(unittest.TestCase):
             m.post(client.DEFAULT_SERVER + '/v2/hi',
                    status_code=200,
                    json={'hi': 'bye'},
-                   request_headers={'Connection': 'close'},
+                   request_headers={'Connection': 'keep-alive'},
                    headers={'Content-Type': 'application/json'})
             ndex = Ndex2()
             ndex.set_debug_mode(True)
@@ -357,24 +649,702 @@ class TestClient(unittest.TestCase):
             self.assertEqual(res.json(), {'hi': 'bye'})
             self.assertEqual(res.status_code, 200)
 
+    def test_get_neighborhoods_as_cx_streams(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            m.post(client.DEFAULT_SERVER + '/v2/network/abc/query',
+                   status_code=200,
+                   json=lambda request, context: request.json(),
+                   headers={'Content-Type': 'application/json'})
+            ndex = Ndex2()
+            names = ['a', 'b', 'c', 'd', 'e']
+            res = dict(ndex.get_neighborhoods_as_cx_streams('abc', names,
+                                                            search_depth=2,
+                                                            concurrency=3))
+            self.assertEqual(sorted(res.keys()), names)
+            for name in names:
+                self.assertEqual(res[name].json(),
+                                 {'searchString': name,
+                                  'searchDepth': 2,
+                                  'edgeLimit': 2500,
+                                  'errorWhenLimitIsOver': True})
+            self.assertEqual(list(ndex.get_neighborhoods_as_cx_streams('abc',
+                                                                       [])),
+                             [])
+
+    def test_get_network_summary_parses_json_with_charset(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            m.get(client.DEFAULT_SERVER + '/v2/network/abc',
+                  status_code=200,
+                  json={'externalId': 'abc'},
+                  headers={'Content-Type': 'application/json;charset=UTF-8'})
+            ndex = Ndex2()
+            res = ndex.get_network_summary('abc')
+            self.assertEqual(res, {'externalId': 'abc'})
+
+    def test_routes_follow_version(self):
+        ndex = Ndex2(skip_version_check=True)
+        self.assertEqual(ndex._routes, client._SERVER_ROUTES)
+        ndex.version = '2.0'
+        self.assertEqual(ndex._routes, client._SERVER_2_0_ROUTES)
+        self.assertEqual(set(client._SERVER_ROUTES.keys()),
+                         set(client._SERVER_2_0_ROUTES.keys()))
+
+        with requests_mock.mock() as m:
+            m.get(client.DEFAULT_SERVER + '/v2/network/abc/aspect/nodes',
+                  status_code=200, json=[])
+            m.get(client.DEFAULT_SERVER + '/v2/network/abc/asCX',
+                  status_code=200, json=[{'nodes': []}])
+            res = ndex.get_network_aspect_as_cx_stream('abc', 'nodes')
+            self.assertEqual(res.json(), [])
+            ndex.version = '2.1'
+            res = ndex.get_network_aspect_as_cx_stream('abc', 'nodes')
+            self.assertEqual(res.json(), [{'nodes': []}])
+
+    def test_get_neighborhood(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            m.post(client.DEFAULT_SERVER + '/v2/search/network/abc/query',
+                   status_code=200,
+                   json={'data': [{'nodes': [{'@id': 0}]}]},
+                   headers={'Content-Type': 'application/json'})
+            ndex = Ndex2()
+            # get_neighborhood is only supported on 2.0 servers
+            ndex.version = '2.0'
+            res = ndex.get_neighborhood('abc', 'foo')
+            self.assertEqual(res, [{'nodes': [{'@id': 0}]}])
+
+    def test_get_neighborhood_stream(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            m.post(client.DEFAULT_SERVER + '/v2/search/network/abc/query',
+                   status_code=200,
+                   json={'data': [{'nodes': [{'@id': 0}]},
+                                  {'edges': []}]},
+                   headers={'Content-Type': 'application/json'})
+            ndex = Ndex2()
+            ndex.version = '2.0'
+            res = ndex.get_neighborhood('abc', 'foo', stream=True)
+            self.assertFalse(isinstance(res, list))
+            self.assertEqual(list(res), [{'nodes': [{'@id': 0}]},
+                                         {'edges': []}])
+
+    def test_get_neighborhood_empty_or_truncated_body(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            url = client.DEFAULT_SERVER + '/v2/search/network/abc/query'
+            ndex = Ndex2()
+            ndex.version = '2.0'
+            for body in (b'', b'{"data": [{"nodes": [{"@id": 0}]}, {"ed'):
+                m.post(url, status_code=200, content=body,
+                       headers={'Content-Type': 'application/json'})
+                # both paths report the bad body the same way
+                with self.assertRaisesRegex(NDExInvalidCXError,
+                                            r'^Query response is not '
+                                            r'valid JSON'):
+                    ndex.get_neighborhood('abc', 'foo')
+                res = ndex.get_neighborhood('abc', 'foo', stream=True)
+                with self.assertRaisesRegex(NDExInvalidCXError,
+                                            r'^Query response is not '
+                                            r'valid JSON'):
+                    list(res)
+
+    def test_get_interconnectquery_stream(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            m.post(client.DEFAULT_SERVER +
+                   '/v2/search/network/abc/interconnectquery',
+                   status_code=200,
+                   json=[{'nodes': [{'@id': 0}]}],
+                   headers={'Content-Type': 'application/json'})
+            ndex = Ndex2()
+            res = ndex.get_interconnectquery('abc', 'foo', stream=True)
+            self.assertEqual(list(res), [{'nodes': [{'@id': 0}]}])
+
+    def test_get_interconnectquery(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            m.post(client.DEFAULT_SERVER +
+                   '/v2/search/network/abc/interconnectquery',
+                   status_code=200,
+                   json=[{'nodes': [{'@id': 0}]}],
+                   headers={'Content-Type': 'application/json'})
+            ndex = Ndex2()
+            res = ndex.get_interconnectquery('abc', 'foo')
+            self.assertEqual(res, [{'nodes': [{'@id': 0}]}])
+
+    def test_grant_networks_to_group_and_user(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            m.put(requests_mock.ANY, status_code=204)
+            ndex = Ndex2(username='bob', password='smith')
+            netids = ['a', 'b', 'c', 'd']
+            res = ndex.grant_networks_to_group('g1', netids, concurrency=2)
+            self.assertEqual(res, {'a': '', 'b': '', 'c': '', 'd': ''})
+            res = ndex.grant_networks_to_user('u1', netids,
+                                              permission='WRITE')
+            self.assertEqual(sorted(res.keys()), netids)
+            puts = [r.url for r in m.request_history if r.method == 'PUT']
+            self.assertEqual(len(puts), 8)
+            base = client.DEFAULT_SERVER + '/v2/network/'
+            for netid in netids:
+                self.assertTrue(base + netid + '/permission?groupid=g1'
+                                '&permission=READ' in puts)
+                self.assertTrue(base + netid + '/permission?userid=u1'
+                                '&permission=WRITE' in puts)
+
+    def test_grant_networks_to_user_returns_error(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            m.put(requests_mock.ANY, status_code=204)
+            m.put(client.DEFAULT_SERVER + '/v2/network/b/permission',
+                  status_code=500)
+            ndex = Ndex2(username='bob', password='smith')
+            res = ndex.grant_networks_to_user('u1', ['a', 'b', 'c'])
+            # the failure is reported for its network, the rest still
+            # get their results
+            self.assertEqual(sorted(res.keys()), ['a', 'b', 'c'])
+            self.assertEqual(res['a'], '')
+            self.assertEqual(res['c'], '')
+            self.assertTrue(isinstance(res['b'], HTTPError))
+            self.assertEqual(res['b'].response.status_code, 500)
+
+    def test_backoff_delay(self):
+        for attempt in range(0, 8):
+            res = client._backoff_delay(attempt, base_delay=0.1,
+                                        max_delay=1.0)
+            expected = min(1.0, 0.1 * 2 ** attempt)
+            self.assertTrue(expected <= res <= expected + 0.1)
+            res = client._backoff_delay(attempt, base_delay=0.1,
+                                        max_delay=1.0, jitter=0.5)
+            self.assertTrue(expected <= res <= expected * 1.5)
+
+    def test_delete_network_retries_on_concurrent_modification(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            locked = {'errorCode': 'NDEx_Concurrent_Modification_Exception'}
+            m.delete(client.DEFAULT_SERVER + '/v2/network/abc',
+                     [{'status_code': 409, 'json': locked},
+                      {'status_code': 409, 'json': locked},
+                      {'status_code': 204}])
+            ndex = Ndex2(username='bob', password='smith')
+            res = ndex.delete_network('abc', base_delay=0.001)
+            self.assertEqual(res, '')
+            self.assertEqual(m.call_count, 4)
+
+            m.delete(client.DEFAULT_SERVER + '/v2/network/abc',
+                     status_code=409, json=locked)
+            delays = []
+            sleep = client.time.sleep
+            client.time.sleep = delays.append
+            try:
+                ndex.delete_network('abc', retry=2, base_delay=0.001)
+                self.fail('Expected exception')
+            except Exception as e:
+                self.assertEqual(str(e), 'Network is locked after 2 retry.')
+            finally:
+                client.time.sleep = sleep
+            # no wait after the 2nd and last attempt
+            self.assertEqual(len(delays), 1)
+
+    def test_delete_networks_from_networkset_retries(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            locked = {'errorCode': 'NDEx_Concurrent_Modification_Exception'}
+            url = client.DEFAULT_SERVER + '/v2/networkset/s1/members'
+            m.delete(url, [{'status_code': 409, 'json': locked},
+                           {'status_code': 204}])
+            ndex = Ndex2(username='bob', password='smith')
+            res = ndex.delete_networks_from_networkset('s1', ['n1'],
+                                                       base_delay=0.001)
+            self.assertEqual(res, '')
+            self.assertEqual(m.last_request.json(), ['n1'])
+
+            m.delete(url, status_code=409, json=locked)
+            try:
+                ndex.delete_networks_from_networkset('s1', ['n1'], retry=3,
+                                                     base_delay=0.001)
+                self.fail('Expected exception')
+            except Exception as e:
+                self.assertEqual(str(e), 'Network is locked after 3 retry.')
+
+    def test_delete_network_only_retries_concurrent_modification(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            url = client.DEFAULT_SERVER + '/v2/network/n1'
+            ndex = Ndex2(username='bob', password='smith')
+
+            # right error code but wrong status, or 409 with no error code
+            for resp in [{'status_code': 500, 'json': {
+                              'errorCode': 'NDEx_Concurrent_Modification'}},
+                         {'status_code': 409, 'text': 'locked'}]:
+                m.delete(url, [resp, {'status_code': 204}])
+                self.assertRaises(HTTPError, ndex.delete_network, 'n1',
+                                  base_delay=0.001)
+
+            m.delete(url, status_code=409, json={
+                'errorCode': 'NDEx_Concurrent_Modification_Exception'})
+            calls = m.call_count
+            try:
+                ndex.delete_network('n1', retry=2, base_delay=0.001)
+                self.fail('Expected NDExConcurrentModificationError')
+            except NDExConcurrentModificationError as e:
+                self.assertEqual(str(e), 'Network is locked after 2 retry.')
+            self.assertEqual(m.call_count - calls, 2)
+
+    def test_delete_networks(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            for i in range(5):
+                m.delete(client.DEFAULT_SERVER + '/v2/network/n%d' % i,
+                         status_code=204)
+            m.delete(client.DEFAULT_SERVER + '/v2/network/bad',
+                     status_code=404, json={'errorCode': 'NDEx_Not_Found'})
+            ndex = Ndex2(username='bob', password='smith')
+            ids = ['n%d' % i for i in range(5)] + ['bad']
+            res = ndex.delete_networks(ids, concurrency=3)
+            self.assertEqual(sorted(res.keys()), sorted(ids))
+            for i in range(5):
+                self.assertEqual(res['n%d' % i], '')
+            self.assertTrue(isinstance(res['bad'], HTTPError))
+
+    def test_get_network_summaries(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            for i in range(3):
+                m.get(client.DEFAULT_SERVER + '/v2/network/n%d' % i,
+                      json={'externalId': 'n%d' % i})
+            m.get(client.DEFAULT_SERVER + '/v2/network/bad', status_code=500)
+            ndex = Ndex2()
+            res = ndex.get_network_summaries(['n0', 'n1', 'n2', 'bad'])
+            for i in range(3):
+                self.assertEqual(res['n%d' % i], {'externalId': 'n%d' % i})
+            self.assertTrue(isinstance(res['bad'], HTTPError))
+            self.assertEqual(ndex.get_network_summaries([]), {})
+
+    def test_make_network_public_and_private(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            m.put(client.DEFAULT_SERVER + '/v2/network/abc/systemproperty',
+                  status_code=204)
+            ndex = Ndex2(username='bob', password='smith')
+            ndex.version = '2.0'
+            ndex.make_network_public('abc')
+            self.assertEqual(m.last_request.json(), {'visibility': 'PUBLIC'})
+            ndex.make_network_private('abc')
+            self.assertEqual(m.last_request.json(), {'visibility': 'PRIVATE'})
+
+            # other 2.x servers do not take visibility in the profile,
+            # so nothing is sent
+            m.post(client.DEFAULT_SERVER + '/v2/network/abc/summary',
+                   status_code=204)
+            ndex.version = '2.1'
+            call_count = m.call_count
+            for func in (ndex.make_network_public, ndex.make_network_private,
+                         ndex._make_network_public_indexed):
+                with self.assertRaisesRegex(Exception,
+                                            r"^Ndex 2.x doesn't support "
+                                            r"setting visibility"):
+                    func('abc')
+            self.assertEqual(m.call_count, call_count)
+
+    def test_ttlcache(self):
+        cache = client._TTLCache(2, 60)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.set('c', 3)
+        # oldest entry is dropped once maxsize is reached
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(cache.get('b'), 2)
+        cache.pop_matching(lambda key: key == 'b')
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('c'), 3)
+
+        cache = client._TTLCache(2, -1)
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), None)
+
+    def test_get_network_summary_read_cache(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            m.get(client.DEFAULT_SERVER + '/v2/network/abc',
+                  [{'json': {'name': 'one'}}, {'json': {'name': 'two'}},
+                   {'json': {'name': 'three'}}])
+            m.post(client.DEFAULT_SERVER + '/v2/network/abc/summary',
+                   status_code=204)
+
+            ndex = Ndex2(username='bob', password='smith')
+            self.assertEqual(ndex.get_network_summary('abc'), {'name': 'one'})
+            self.assertEqual(ndex.get_network_summary('abc'), {'name': 'two'})
+
+            ndex = Ndex2(username='bob', password='smith', cache_ttl=60)
+            res = ndex.get_network_summary('abc')
+            self.assertEqual(res, {'name': 'three'})
+            res['name'] = 'changed'
+            self.assertEqual(ndex.get_network_summary('abc'),
+                             {'name': 'three'})
+            # version check + 3 summaries, the second summary from
+            # this client came from the cache
+            self.assertEqual(m.call_count, 4)
+
+            m.get(client.DEFAULT_SERVER + '/v2/network/abc',
+                  json={'name': 'four'})
+            self.assertEqual(ndex.get_network_summary('abc', cache=False),
+                             {'name': 'four'})
+            m.get(client.DEFAULT_SERVER + '/v2/network/abc',
+                  json={'name': 'five'})
+            self.assertEqual(ndex.get_network_summary('abc'),
+                             {'name': 'four'})
+
+            # updates evict the network from the cache
+            ndex.update_network_profile('abc', {'name': 'five'})
+            self.assertEqual(ndex.get_network_summary('abc'),
+                             {'name': 'five'})
+
+    def test_get_json_single_flight(self):
+        started = threading.Event()
+        release = threading.Event()
+
+        def summary(request, context):
+            started.set()
+            release.wait(5)
+            return {'name': 'foo'}
+
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            m.get(client.DEFAULT_SERVER + '/v2/network/abc', json=summary)
+            ndex = Ndex2()
+            results = []
+
+            def worker():
+                results.append(ndex.get_network_summary('abc'))
+
+            threads = [threading.Thread(target=worker) for _ in range(3)]
+            threads[0].start()
+            started.wait(5)
+            for t in threads[1:]:
+                t.start()
+            time.sleep(0.1)
+            release.set()
+            for t in threads:
+                t.join(5)
+            self.assertEqual(results, [{'name': 'foo'}] * 3)
+            # every thread, the one that sent the GET included, gets
+            # its own copy, so changing one cannot reach the others
+            self.assertEqual(len(set(id(r) for r in results)), 3)
+            results[0]['name'] = 'changed'
+            self.assertEqual(results[1:], [{'name': 'foo'}] * 2)
+            # version check + one summary
+            self.assertEqual(m.call_count, 2)
+
+            # nothing is left in flight, so the next call goes out
+            self.assertEqual(ndex.get_network_summary('abc'), {'name': 'foo'})
+            self.assertEqual(m.call_count, 3)
+
+    def test_get_network_set_read_cache(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            url = client.DEFAULT_SERVER + '/v2/networkset/s1'
+            m.get(url, json={'networks': ['n1']})
+            m.post(url + '/members', status_code=204)
+            m.delete(url + '/members', status_code=204)
+            ndex = Ndex2(username='bob', password='smith', cache_ttl=60)
+            self.assertEqual(ndex.get_network_set('s1'), {'networks': ['n1']})
+            m.get(url, json={'networks': ['n1', 'n2']})
+            self.assertEqual(ndex.get_network_set('s1'), {'networks': ['n1']})
+
+            ndex.add_networks_to_networkset('s1', ['n2'])
+            self.assertEqual(ndex.get_network_set('s1'),
+                             {'networks': ['n1', 'n2']})
+            m.get(url, json={'networks': ['n2']})
+            ndex.delete_networks_from_networkset('s1', ['n1'])
+            self.assertEqual(ndex.get_network_set('s1'), {'networks': ['n2']})
+
+    def test_iter_json_array(self):
+        for items in [[], ['a'], ['a', 'b', 'c'], list(range(7))]:
+            for chunk in [1, 2, 3, 10]:
+                body = b''.join(client._iter_json_array(items, chunk=chunk))
+                self.assertEqual(json.loads(body), items)
+        self.assertEqual(list(client._iter_json_array(['a', 'b', 'c'],
+                                                      chunk=2)),
+                         [b'["a","b"', b',"c"', b']'])
+
+    def test_add_networks_to_networkset_streams_long_lists(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            m.post(client.DEFAULT_SERVER + '/v2/networkset/s1/members',
+                   status_code=204)
+            ndex = Ndex2(username='bob', password='smith')
+            ndex.add_networks_to_networkset('s1', ['n1', 'n2'])
+            self.assertEqual(m.last_request.body, b'["n1","n2"]')
+
+            ids = ['n%d' % i for i in range(Ndex2.STREAM_CHUNK_SIZE + 1)]
+            ndex.add_networks_to_networkset('s1', ids)
+            body = m.last_request.body
+            self.assertFalse(isinstance(body, bytes))
+            self.assertEqual(json.loads(b''.join(body)), ids)
+
+    def test_set_network_properties_bodies(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            m.put(client.DEFAULT_SERVER + '/v2/network/abc/properties',
+                  status_code=204)
+            m.put(client.DEFAULT_SERVER + '/v2/network/abc/systemproperty',
+                  status_code=204)
+            ndex = Ndex2(username='bob', password='smith')
+            props = [{'predicateString': 'x', 'value': 'y'}]
+            ndex.set_network_properties('abc', props)
+            self.assertEqual(m.last_request.json(), props)
+            ndex.set_network_properties('abc', '[]')
+            self.assertEqual(m.last_request.text, '[]')
+            ndex.set_network_system_properties('abc', {'readOnly': True})
+            self.assertEqual(m.last_request.json(), {'readOnly': True})
+            for func in [ndex.set_network_properties,
+                         ndex.set_network_system_properties,
+                         ndex.update_network_profile]:
+                try:
+                    func('abc', 5)
+                    self.fail('Expected NDExError')
+                except NDExError as ne:
+                    self.assertTrue('must be a string, a dict or a list, '
+                                    'not int' in str(ne))
+
+    def test_update_network_profile_rejects_visibility_in_any_body(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            m.post(client.DEFAULT_SERVER + '/v2/network/abc/summary',
+                   status_code=204)
+            ndex = Ndex2(username='bob', password='smith')
+            call_count = m.call_count
+            visibility = {'visibility': 'PUBLIC'}
+            for body in (visibility, json.dumps(visibility),
+                         json.dumps(visibility).encode('utf-8')):
+                with self.assertRaisesRegex(Exception,
+                                            r"^Ndex 2.x doesn't support "
+                                            r"setting visibility"):
+                    ndex.update_network_profile('abc', body)
+            self.assertEqual(m.call_count, call_count)
+
+            # other profiles are still sent whatever their type
+            for body in ({'name': 'x'}, '{"name": "x"}', b'{"name": "x"}'):
+                ndex.update_network_profile('abc', body)
+                self.assertEqual(m.last_request.json(), {'name': 'x'})
+
+    def test_make_network_public_indexed(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            m.put(client.DEFAULT_SERVER + '/v2/network/abc/systemproperty',
+                  [{'status_code': 500}, {'status_code': 204}])
+            ndex = Ndex2(username='bob', password='smith')
+            ndex.version = '2.0'
+            self.assertEqual(ndex._make_network_public_indexed('abc'), '')
+            # stops once the update succeeds
+            self.assertEqual(m.call_count, 3)
+
+            m.put(client.DEFAULT_SERVER + '/v2/network/abc/systemproperty',
+                  status_code=500)
+            delays = []
+            sleep = client.time.sleep
+            client.time.sleep = delays.append
+            try:
+                ndex._make_network_public_indexed('abc')
+                self.fail('Expected HTTPError')
+            except HTTPError as he:
+                self.assertEqual(he.response.status_code, 500)
+            finally:
+                client.time.sleep = sleep
+            # no wait after the 4th and last attempt
+            self.assertEqual(len(delays), 3)
+
+    def test_get_user_network_summaries_caches_user_id(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            m.get(client.DEFAULT_SERVER + '/v2/user?username=bob',
+                  json={'externalId': 'u1'},
+                  headers={'Content-Type': 'application/json'})
+            m.get(client.DEFAULT_SERVER + '/v2/user/u1/networksummary/asCX',
+                  json=[{'externalId': 'n1'}],
+                  headers={'Content-Type': 'application/json'})
+            ndex = Ndex2()
+            for offset in [0, 1, 2]:
+                res = ndex.get_user_network_summaries('bob', offset=offset)
+                self.assertEqual(res, [{'externalId': 'n1'}])
+            user_gets = [r for r in m.request_history
+                         if r.path == '/v2/user']
+            self.assertEqual(len(user_gets), 1)
+
+            # expired entries are looked up again
+            ndex._user_id_cache['bob'] = ('u1', 0)
+            ndex.get_user_network_summaries('bob')
+            user_gets = [r for r in m.request_history
+                         if r.path == '/v2/user']
+            self.assertEqual(len(user_gets), 2)
+
+    def test_iter_user_network_summaries_and_get_network_ids(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            m.get(client.DEFAULT_SERVER + '/v2/user?username=bob',
+                  json={'externalId': 'u1'},
+                  headers={'Content-Type': 'application/json'})
+            summaries = [{'externalId': 'n1', 'name': 'one'},
+                         {'externalId': 'n2', 'name': 'two',
+                          'properties': [{'externalId': 'nested'}]}]
+            m.get(client.DEFAULT_SERVER + '/v2/user/u1/networksummary/asCX',
+                  json=summaries,
+                  headers={'Content-Type': 'application/json'})
+            ndex = Ndex2()
+            res = ndex.iter_user_network_summaries('bob', limit=2)
+            self.assertFalse(isinstance(res, list))
+            self.assertEqual(list(res), summaries)
+            self.assertTrue('limit=2' in m.last_request.url)
+            self.assertEqual(ndex.get_network_ids_for_user('bob'),
+                             ['n1', 'n2'])
+
+    def test_iter_user_network_summaries_gzip_response(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            m.get(client.DEFAULT_SERVER + '/v2/user?username=bob',
+                  json={'externalId': 'u1'},
+                  headers={'Content-Type': 'application/json'})
+            summaries = [{'externalId': 'n1', 'name': 'one'}]
+            body = gzip.compress(json.dumps(summaries).encode('utf-8'))
+            m.get(client.DEFAULT_SERVER + '/v2/user/u1/networksummary/asCX',
+                  content=body,
+                  headers={'Content-Type': 'application/json',
+                           'Content-Encoding': 'gzip'})
+            ndex = Ndex2()
+            self.assertEqual(list(ndex.iter_user_network_summaries('bob')),
+                             summaries)
+            self.assertEqual(ndex.get_network_ids_for_user('bob'), ['n1'])
+            self.assertTrue('gzip' in
+                            m.last_request.headers['Accept-Encoding'])
+
+    def test_iter_all_user_network_summaries(self):
+        summaries = [{'externalId': 'n%d' % i} for i in range(7)]
+
+        def page(request, context):
+            offset = int(request.qs['offset'][0])
+            limit = int(request.qs['limit'][0])
+            return summaries[offset:offset + limit]
+
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            m.get(client.DEFAULT_SERVER + '/v2/user?username=bob',
+                  json={'externalId': 'u1'},
+                  headers={'Content-Type': 'application/json'})
+            m.get(client.DEFAULT_SERVER + '/v2/user/u1/networksummary/asCX',
+                  json=page,
+                  headers={'Content-Type': 'application/json'})
+            ndex = Ndex2()
+            for page_size, concurrency in [(2, 1), (2, 3), (7, 2), (10, 4)]:
+                res = list(ndex.iter_all_user_network_summaries(
+                    'bob', page_size=page_size, concurrency=concurrency))
+                self.assertEqual(res, summaries)
+
+            # stopping early does not page through the rest, the
+            # prefetched page may or may not have been requested
+            calls = m.call_count
+            gen = ndex.iter_all_user_network_summaries('bob', page_size=2,
+                                                       concurrency=1)
+            self.assertEqual(next(gen), summaries[0])
+            gen.close()
+            self.assertTrue(m.call_count - calls in (1, 2))
+
+    def test_query_parameters_are_encoded(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            m.get(client.DEFAULT_SERVER + '/v2/user', json={'externalId': 'u1'})
+            m.put(client.DEFAULT_SERVER + '/v2/network/n1/permission',
+                  status_code=204)
+            ndex = Ndex2(username='bob', password='smith')
+            ndex.get_user_by_username('bob&x=1 y')
+            self.assertEqual(m.last_request.qs, {'username': ['bob&x=1 y']})
+            ndex.update_network_user_permission('u&1', 'n1', 'READ')
+            self.assertEqual(m.last_request.qs, {'userid': ['u&1'],
+                                                 'permission': ['read']})
+
+    def test_grant_network_to_user_by_username(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            m.get(client.DEFAULT_SERVER + '/v2/user?username=bob',
+                  json={'externalId': 'u1'},
+                  headers={'Content-Type': 'application/json'})
+            m.put(client.DEFAULT_SERVER + '/v2/network/n1/permission'
+                  '?userid=u1&permission=READ', status_code=204)
+            ndex = Ndex2(username='bob', password='smith')
+            res = ndex.grant_network_to_user_by_username('bob', 'n1', 'READ')
+            self.assertEqual(res, '')
+            self.assertEqual(m.last_request.method, 'PUT')
+
     def test_ndex2_put_multipart(self):
         with requests_mock.mock() as m:
             m.get(self.get_rest_admin_status_url(),
                   json=self.get_rest_admin_status_dict())
             m.put(client.DEFAULT_SERVER + '/v2/hi',
-                  request_headers={'Connection': 'close'},
+                  request_headers={'Connection': 'keep-alive'},
                   status_code=200)
             ndex = Ndex2()
             ndex.set_debug_mode(True)
             res = ndex.put_multipart('/hi', fields={"x": "y"})
             self.assertEqual(res, '')
 
+    def test_ndex2_put_multipart_uses_session_auth(self):
+        with requests_mock.mock() as m:
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            m.put(client.DEFAULT_SERVER + '/v2/hi',
+                  status_code=200)
+            ndex = Ndex2(username='bob', password='smith')
+            res = ndex.put_multipart('/hi', fields={"x": "y"})
+            self.assertEqual(res, '')
+            self.assertTrue(m.last_request.headers['Authorization']
+                            .startswith('Basic '))
+
+    def test_precomputed_basic_auth(self):
+        auth = client._PrecomputedBasicAuth('bob', 'smith')
+        expected = requests.Request('GET', 'http://foo',
+                                    auth=('bob', 'smith')).prepare()
+        req = auth(requests.Request('GET', 'http://foo').prepare())
+        self.assertEqual(req.headers['Authorization'],
+                         expected.headers['Authorization'])
+        self.assertEqual(auth, requests.auth.HTTPBasicAuth('bob', 'smith'))
+        self.assertNotEqual(auth, client._PrecomputedBasicAuth('bob', 'x'))
+
     def test_ndex2_post_multipart(self):
         with requests_mock.mock() as m:
             m.get(self.get_rest_admin_status_url(),
                   json=self.get_rest_admin_status_dict())
             m.post(client.DEFAULT_SERVER + '/v2/hi',
-                  request_headers={'Connection': 'close'},
+                  request_headers={'Connection': 'keep-alive'},
                   status_code=200)
             ndex = Ndex2()
             ndex.set_debug_mode(True)
@@ -386,7 +1356,7 @@ class TestClient(unittest.TestCase):
             m.get(self.get_rest_admin_status_url(),
                   json=self.get_rest_admin_status_dict())
             m.post(client.DEFAULT_SERVER + '/v2/hi?yo=1',
-                  request_headers={'Connection': 'close'},
+                  request_headers={'Connection': 'keep-alive'},
                   status_code=200)
             ndex = Ndex2()
             ndex.set_debug_mode(True)
@@ -432,7 +1402,7 @@ class TestClient(unittest.TestCase):
             m.get(self.get_rest_admin_status_url(),
                   json=self.get_rest_admin_status_dict())
             m.post(client.DEFAULT_SERVER + '/v2/network/asCX',
-                   request_headers={'Connection': 'close'},
+                   request_headers={'Connection': 'keep-alive'},
                    status_code=1,
                    text=resurl)
             ndex = Ndex2(username='bob', password='warnerbrandis')
@@ -441,10 +1411,9 @@ class TestClient(unittest.TestCase):
             decode_txt = m.last_request.text.read().decode('UTF-8')
             self.assertTrue('Content-Disposition: form-data; name="CXNetworkStream"; filename="filename"' in decode_txt)
             self.assertTrue('Content-Type: application/octet-stream' in decode_txt)
-            self.assertTrue('{"foo": "123"}' in decode_txt)
-            self.assertTrue('{"status": [{"' in decode_txt)
-            self.assertTrue('"error": ""' in decode_txt)
-            self.assertTrue('"success": true' in decode_txt)
+            self.assertEqual(self.get_cx_from_multipart(decode_txt),
+                             [{'foo': '123'},
+                              {'status': [{'error': '', 'success': True}]}])
 
     def test_save_new_network_cx_with_emptystatus_and_publicvisibility(self):
         with requests_mock.mock() as m:
@@ -452,7 +1421,7 @@ class TestClient(unittest.TestCase):
             m.get(self.get_rest_admin_status_url(),
                   json=self.get_rest_admin_status_dict())
             m.post(client.DEFAULT_SERVER + '/v2/network/asCX?visibility=PUBLIC',
-                   request_headers={'Connection': 'close'},
+                   request_headers={'Connection': 'keep-alive'},
                    status_code=1,
                    text=resurl)
             ndex = Ndex2(username='bob', password='warnerbrandis')
@@ -463,10 +1432,33 @@ class TestClient(unittest.TestCase):
             decode_txt = m.last_request.text.read().decode('UTF-8')
             self.assertTrue('Content-Disposition: form-data; name="CXNetworkStream"; filename="filename"' in decode_txt)
             self.assertTrue('Content-Type: application/octet-stream' in decode_txt)
-            self.assertTrue('{"foo": "123"}' in decode_txt)
-            self.assertTrue('{"status": [{"' in decode_txt)
-            self.assertTrue('"error": ""' in decode_txt)
-            self.assertTrue('"success": true' in decode_txt)
+            self.assertEqual(self.get_cx_from_multipart(decode_txt),
+                             [{'foo': '123'},
+                              {'status': [{'error': '', 'success': True}]}])
+
+    def test_save_new_network_with_progress_callback(self):
+        with requests_mock.mock() as m:
+            resurl = client.DEFAULT_SERVER + '/v2/network/asdf'
+            m.get(self.get_rest_admin_status_url(),
+                  json=self.get_rest_admin_status_dict())
+            m.post(client.DEFAULT_SERVER + '/v2/network/asCX',
+                   status_code=1,
+                   text=resurl)
+            progress = []
+
+            def callback(monitor):
+                progress.append((monitor.bytes_read, monitor.len))
+
+            ndex = Ndex2(username='bob', password='warnerbrandis')
+            res = ndex.save_new_network([{'foo': '123'}],
+                                        progress_callback=callback)
+            self.assertEqual(res, resurl)
+            decode_txt = m.last_request.text.read().decode('UTF-8')
+            self.assertEqual(self.get_cx_from_multipart(decode_txt),
+                             [{'foo': '123'},
+                              {'status': [{'error': '', 'success': True}]}])
+            self.assertTrue(len(progress) > 0)
+            self.assertEqual(progress[-1][0], progress[-1][1])
 
     def test_save_new_network_cx_with_status(self):
         with requests_mock.mock() as m:
@@ -474,7 +1466,7 @@ class TestClient(unittest.TestCase):
             m.get(self.get_rest_admin_status_url(),
                   json=self.get_rest_admin_status_dict())
             m.post(client.DEFAULT_SERVER + '/v2/network/asCX',
-                   request_headers={'Connection': 'close'},
+                   request_headers={'Connection': 'keep-alive'},
                    status_code=1,
                    text=resurl)
             ndex = Ndex2(username='bob', password='warnerbrandis')
@@ -484,7 +1476,6 @@ class TestClient(unittest.TestCase):
             decode_txt = m.last_request.text.read().decode('UTF-8')
             self.assertTrue('Content-Disposition: form-data; name="CXNetworkStream"; filename="filename"' in decode_txt)
             self.assertTrue('Content-Type: application/octet-stream' in decode_txt)
-            self.assertTrue('{"foo": "123"}' in decode_txt)
-            self.assertTrue('{"status": [{"' in decode_txt)
-            self.assertTrue('"error": ""' in decode_txt)
-            self.assertTrue('"success": true' in decode_txt)
+            self.assertEqual(self.get_cx_from_multipart(decode_txt),
+                             [{'foo': '123'},
+                              {'status': [{'error': '', 'success': True}]}])
@@ -4,27 +4,58 @@
 """Tests for `nice_cx_network` package."""
 
 import os
+import re
 import unittest
+import collections
 import sys
 
 import requests_mock
 from ndex2 import client
+from ndex2.client import Ndex2
 from ndex2.nice_cx_network import NiceCXNetwork
 from ndex2.exceptions import NDExError
 from ndex2 import constants
 from ndex2.nice_cx_network import DefaultNetworkXFactory
 import ndex2
 
+# node attribute keys, bound once for the assertions below
+_POF = constants.NODE_ATTR_PROPERTYOF
+_NAME = constants.NODE_ATTR_NAME
+_VAL = constants.NODE_ATTR_VALUE
+_DT = constants.NODE_ATTR_DATATYPE
+
+# parts of a parsed CX fixture that _clone_template() wires into a new
+# network, sharing the elements and copying only the containers
+_Template = collections.namedtuple('_Template',
+                                   ['nodes', 'edges', 'node_attrs',
+                                    'edge_attrs', 'network_attrs', 'context',
+                                    'metadata', 'opaque_aspects'])
+
+# everything the multipart body of a one node network upload has to
+# contain, checked in a single search anchored at the start of the body,
+# a bytes pattern so the body does not have to be decoded first
+_UPLOAD_RE = re.compile(rb'\A(?=.*Content-Disposition: form-data; '
+                        rb'name="CXNetworkStream"; filename="filename")'
+                        rb'(?=.*Content-Type: application/octet-stream)'
+                        rb'(?=.*\{"nodes":\s*\[\{)'
+                        rb'(?=.*"@id":\s*0)'
+                        rb'(?=.*"n":\s*"bob")'
+                        rb'(?=.*"r":\s*"bob")'
+                        rb'(?=.*\{"status":\s*\[\{")'
+                        rb'(?=.*"error":\s*"")'
+                        rb'(?=.*"success":\s*true)', re.S)
 
 
 class TestNiceCXNetwork(unittest.TestCase):
 
-    TEST_DIR = os.path.dirname(__file__)
-    WNT_SIGNAL_FILE = os.path.join(TEST_DIR, 'data', 'wntsignaling.cx')
-    DARKTHEME_FILE = os.path.join(TEST_DIR, 'data', 'darkthemefinal.cx')
-    DARKTHEMENODE_FILE = os.path.join(TEST_DIR, 'data',
-                                      'darkthemefinalwithnodevis.cx')
-    GLYPICAN_FILE = os.path.join(TEST_DIR, 'data', 'glypican2.cx')
+    # admin status of a 2.4.0 server, built once and shared by the
+    # upload and update tests, requests_mock never changes it
+    _ADMIN_STATUS_240 = {"networkCount": 1321,
+                         "userCount": 12,
+                         "groupCount": 0,
+                         "message": "Online",
+                         "properties": {"ServerVersion": "2.4.0",
+                                        "ServerResultLimit": "10000"}}
 
     def get_rest_admin_status_dict(self, server_version):
         return {"networkCount": 1321,
@@ -37,9 +68,20 @@ class TestNiceCXNetwork(unittest.TestCase):
     def get_rest_admin_status_url(self):
         return client.DEFAULT_SERVER + '/rest/admin/status'
 
+    def _request_body(self, request):
+        # multipart requests keep the encoder as the body, read it once
+        body = request.body
+        if isinstance(body, (bytes, bytearray)):
+            return body
+        return body.read()
+
+    def _register_admin(self, m):
+        m.get(self.get_rest_admin_status_url(),
+              json=TestNiceCXNetwork._ADMIN_STATUS_240)
+
     def setUp(self):
         """Set up test fixtures, if any."""
-        pass
+        Ndex2._version_cache.clear()
 
     def tearDown(self):
         """Tear down test fixtures, if any."""
@@ -85,27 +127,20 @@ class TestNiceCXNetwork(unittest.TestCase):
 
     def test_set_node_attribute_none_values(self):
         net = NiceCXNetwork()
-        try:
+        with self.assertRaisesRegex(NDExError,
+                                    r'^Node attribute requires property_of$'):
             net.set_node_attribute(None, 'foo', 'blah')
-            self.fail('Expected exception')
-        except NDExError as ne:
-            self.assertEqual(str(ne), 'Node attribute requires property_of')
 
-        try:
+        with self.assertRaisesRegex(NDExError,
+                                    r'^Node attribute requires the name and '
+                                    r'values property$'):
             net.set_node_attribute('hi', None, 'blah')
-            self.fail('Expected exception')
-        except NDExError as ne:
-            self.assertEqual(str(ne), 'Node attribute requires the name and '
-                                      'values property')
 
     def test_set_node_attribute_passing_empty_dict(self):
         # try int
         net = NiceCXNetwork()
-        try:
+        with self.assertRaisesRegex(NDExError, r'^No id found in Node$'):
             net.set_node_attribute({}, 'attrname', 5)
-            self.fail('Expected NDExError')
-        except NDExError as ne:
-            self.assertEqual(str(ne), 'No id found in Node')
 
     def test_set_node_attribute_passing_node_object(self):
         # try int
@@ -115,124 +150,55 @@ class TestNiceCXNetwork(unittest.TestCase):
         net.set_node_attribute(node, 'attrname', 5)
         res = net.get_node_attributes(node_id)
         self.assertEqual(len(res), 1)
-        self.assertEqual(res[0][constants.NODE_ATTR_PROPERTYOF], node_id)
-        self.assertEqual(res[0][constants.NODE_ATTR_NAME], 'attrname')
-        self.assertEqual(res[0][constants.NODE_ATTR_VALUE], 5)
-        self.assertEqual(res[0][constants.NODE_ATTR_DATATYPE], 'integer')
+        self.assertEqual(res[0][_POF], node_id)
+        self.assertEqual(res[0][_NAME], 'attrname')
+        self.assertEqual(res[0][_VAL], 5)
+        self.assertEqual(res[0][_DT], 'integer')
 
     def test_set_node_attribute_empty_add_autodetect_datatype(self):
-
-        # try int
         net = NiceCXNetwork()
-        net.set_node_attribute(1, 'attrname', 5)
-        res = net.get_node_attributes(1)
-        self.assertEqual(len(res), 1)
-        self.assertEqual(res[0][constants.NODE_ATTR_PROPERTYOF], 1)
-        self.assertEqual(res[0][constants.NODE_ATTR_NAME], 'attrname')
-        self.assertEqual(res[0][constants.NODE_ATTR_VALUE], 5)
-        self.assertEqual(res[0][constants.NODE_ATTR_DATATYPE], 'integer')
-
-        # try double/float
-        net = NiceCXNetwork()
-        net.set_node_attribute(1, 'attrname', 5.5)
-        res = net.get_node_attributes(1)
-        self.assertEqual(len(res), 1)
-        self.assertEqual(res[0][constants.NODE_ATTR_PROPERTYOF], 1)
-        self.assertEqual(res[0][constants.NODE_ATTR_NAME], 'attrname')
-        self.assertEqual(res[0][constants.NODE_ATTR_VALUE], 5.5)
-        self.assertEqual(res[0][constants.NODE_ATTR_DATATYPE], 'double')
-
-        # try list of string
-        net = NiceCXNetwork()
-        net.set_node_attribute(1, 'attrname', ['hi', 'bye'])
-        res = net.get_node_attributes(1)
-        self.assertEqual(len(res), 1)
-        self.assertEqual(res[0][constants.NODE_ATTR_PROPERTYOF], 1)
-        self.assertEqual(res[0][constants.NODE_ATTR_NAME], 'attrname')
-        self.assertEqual(res[0][constants.NODE_ATTR_VALUE], ['hi', 'bye'])
-        self.assertEqual(res[0][constants.NODE_ATTR_DATATYPE], 'list_of_string')
+        for value, datatype in [(5, 'integer'),
+                                (5.5, 'double'),
+                                (['hi', 'bye'], 'list_of_string')]:
+            with self.subTest(datatype=datatype):
+                net.nodeAttributes.clear()
+                net.set_node_attribute(1, 'attrname', value)
+                res = net.get_node_attributes(1)
+                self.assertEqual(len(res), 1)
+                self.assertEqual(res[0][_POF], 1)
+                self.assertEqual(res[0][_NAME], 'attrname')
+                self.assertEqual(res[0][_VAL], value)
+                self.assertEqual(res[0][_DT], datatype)
 
     def test_set_node_attribute_empty_add_overwrite_toggled(self):
         net = NiceCXNetwork()
-        net.set_node_attribute(1, 'attrname', 'value')
-        res = net.get_node_attributes(1)
-        self.assertEqual(len(res), 1)
-        self.assertEqual(res[0][constants.NODE_ATTR_PROPERTYOF], 1)
-        self.assertEqual(res[0][constants.NODE_ATTR_NAME], 'attrname')
-        self.assertEqual(res[0][constants.NODE_ATTR_VALUE], 'value')
-
-        net = NiceCXNetwork()
-        net.set_node_attribute(1, 'attrname', 1, type='double')
-        res = net.get_node_attributes(1)
-        self.assertEqual(len(res), 1)
-        self.assertEqual(res[0][constants.NODE_ATTR_PROPERTYOF], 1)
-        self.assertEqual(res[0][constants.NODE_ATTR_NAME], 'attrname')
-        self.assertEqual(res[0][constants.NODE_ATTR_VALUE], 1)
-
-        net = NiceCXNetwork()
-        net.set_node_attribute(1, 'attrname', 'value', overwrite=True)
-        res = net.get_node_attributes(1)
-        self.assertEqual(len(res), 1)
-        self.assertEqual(res[0][constants.NODE_ATTR_PROPERTYOF], 1)
-        self.assertEqual(res[0][constants.NODE_ATTR_NAME], 'attrname')
-        self.assertEqual(res[0][constants.NODE_ATTR_VALUE], 'value')
-
-        net = NiceCXNetwork()
-        net.set_node_attribute(1, 'attrname', 1, type='double',
-                               overwrite=True)
-        res = net.get_node_attributes(1)
-        self.assertEqual(len(res), 1)
-        self.assertEqual(res[0][constants.NODE_ATTR_PROPERTYOF], 1)
-        self.assertEqual(res[0][constants.NODE_ATTR_NAME], 'attrname')
-        self.assertEqual(res[0][constants.NODE_ATTR_VALUE], 1)
+        for value, kwargs in [('value', {}),
+                              (1, {'type': 'double'}),
+                              ('value', {'overwrite': True}),
+                              (1, {'type': 'double', 'overwrite': True})]:
+            with self.subTest(value=value, **kwargs):
+                net.nodeAttributes.clear()
+                net.set_node_attribute(1, 'attrname', value, **kwargs)
+                res = net.get_node_attributes(1)
+                self.assertEqual(len(res), 1)
+                self.assertEqual(res[0][_POF], 1)
+                self.assertEqual(res[0][_NAME], 'attrname')
+                self.assertEqual(res[0][_VAL], value)
 
     def test_set_node_attribute_add_duplicate_attributes(self):
         net = NiceCXNetwork()
-        net.set_node_attribute(1, 'attrname', 'value')
-        res = net.get_node_attributes(1)
-        self.assertEqual(len(res), 1)
-        self.assertEqual(res[0][constants.NODE_ATTR_PROPERTYOF], 1)
-        self.assertEqual(res[0][constants.NODE_ATTR_NAME], 'attrname')
-        self.assertEqual(res[0][constants.NODE_ATTR_VALUE], 'value')
-
-        net.set_node_attribute(1, 'attrname', 'value2')
-        res = net.get_node_attributes(1)
-        self.assertEqual(len(res), 2)
-        self.assertEqual(res[0][constants.NODE_ATTR_PROPERTYOF], 1)
-        self.assertEqual(res[0][constants.NODE_ATTR_NAME], 'attrname')
-        self.assertEqual(res[0][constants.NODE_ATTR_VALUE], 'value')
-        self.assertEqual(res[1][constants.NODE_ATTR_PROPERTYOF], 1)
-        self.assertEqual(res[1][constants.NODE_ATTR_NAME], 'attrname')
-        self.assertEqual(res[1][constants.NODE_ATTR_VALUE], 'value2')
-
-        net.set_node_attribute(1, 'attrname', 'value3')
-        res = net.get_node_attributes(1)
-        self.assertEqual(len(res), 3)
-        self.assertEqual(res[0][constants.NODE_ATTR_PROPERTYOF], 1)
-        self.assertEqual(res[0][constants.NODE_ATTR_NAME], 'attrname')
-        self.assertEqual(res[0][constants.NODE_ATTR_VALUE], 'value')
-        self.assertEqual(res[1][constants.NODE_ATTR_PROPERTYOF], 1)
-        self.assertEqual(res[1][constants.NODE_ATTR_NAME], 'attrname')
-        self.assertEqual(res[1][constants.NODE_ATTR_VALUE], 'value2')
-        self.assertEqual(res[2][constants.NODE_ATTR_PROPERTYOF], 1)
-        self.assertEqual(res[2][constants.NODE_ATTR_NAME], 'attrname')
-        self.assertEqual(res[2][constants.NODE_ATTR_VALUE], 'value3')
+        expected = []
+        for value in ['value', 'value2', 'value3']:
+            net.set_node_attribute(1, 'attrname', value)
+            expected.append({_POF: 1, _NAME: 'attrname', _VAL: value})
+        self.assertEqual(net.get_node_attributes(1), expected)
 
     def test_set_node_attribute_add_duplicate_attributes_overwriteset(self):
         net = NiceCXNetwork()
         net.set_node_attribute(1, 'attrname', 'value', overwrite=True)
-        res = net.get_node_attributes(1)
-        self.assertEqual(len(res), 1)
-        self.assertEqual(res[0][constants.NODE_ATTR_PROPERTYOF], 1)
-        self.assertEqual(res[0][constants.NODE_ATTR_NAME], 'attrname')
-        self.assertEqual(res[0][constants.NODE_ATTR_VALUE], 'value')
-
         net.set_node_attribute(1, 'attrname', 'value2', overwrite=True)
-        res = net.get_node_attributes(1)
-        self.assertEqual(len(res), 1)
-        self.assertEqual(res[0][constants.NODE_ATTR_PROPERTYOF], 1)
-        self.assertEqual(res[0][constants.NODE_ATTR_NAME], 'attrname')
-        self.assertEqual(res[0][constants.NODE_ATTR_VALUE], 'value2')
+        self.assertEqual(net.get_node_attributes(1),
+                         [{_POF: 1, _NAME: 'attrname', _VAL: 'value2'}])
 
     def test_get_network_attribute_names(self):
         net = NiceCXNetwork()
@@ -351,65 +317,99 @@ class TestNiceCXNetwork(unittest.TestCase):
         net.create_edge(edge_source=0, edge_target=1)
         self.assertEqual('nodes: 3 \n edges: 1', str(net))
 
-    def test_upload_to_success(self):
-        with requests_mock.mock() as m:
-            resurl = client.DEFAULT_SERVER + '/v2/network/asdf'
-            m.get(self.get_rest_admin_status_url(),
-                  json=self.get_rest_admin_status_dict("2.4.0"))
-            m.post(client.DEFAULT_SERVER + '/v2/network/asCX',
-                   request_headers={'Connection': 'close'},
-                   status_code=1,
-                   text=resurl)
-            net = NiceCXNetwork()
-            net.create_node('bob')
-            res = net.upload_to(client.DEFAULT_SERVER, 'bob', 'warnerbrandis',
-                                user_agent='jeez')
-            self.assertEqual(res, resurl)
-            decode_txt = m.last_request.text.read().decode('UTF-8')
-            self.assertEqual(m.last_request.headers['User-Agent'],
-                             client.userAgent + ' jeez')
-            self.assertTrue('Content-Disposition: form-data; name='
-                            '"CXNetworkStream"; filename='
-                            '"filename"' in decode_txt)
-            self.assertTrue('Content-Type: application/'
-                            'octet-stream' in decode_txt)
-            self.assertTrue('{"nodes": [{' in decode_txt)
-            self.assertTrue('"@id": 0' in decode_txt)
-            self.assertTrue('"n": "bob"' in decode_txt)
-            self.assertTrue('"r": "bob"' in decode_txt)
-            self.assertTrue('{"status": [{"' in decode_txt)
-            self.assertTrue('"error": ""' in decode_txt)
-            self.assertTrue('"success": true' in decode_txt)
-
-    def test_update_to_success(self):
+    @requests_mock.Mocker()
+    def test_upload_to_success(self, m):
+        resurl = client.DEFAULT_SERVER + '/v2/network/asdf'
+        self._register_admin(m)
+        m.post(client.DEFAULT_SERVER + '/v2/network/asCX',
+               request_headers={'Connection': 'keep-alive'},
+               status_code=1,
+               text=resurl)
+        net = NiceCXNetwork()
+        net.create_node('bob')
+        res = net.upload_to(client.DEFAULT_SERVER, 'bob', 'warnerbrandis',
+                            user_agent='jeez')
+        self.assertEqual(res, resurl)
+        body = self._request_body(m.last_request)
+        self.assertEqual(m.last_request.headers['User-Agent'],
+                         client.userAgent + ' jeez')
+        self.assertRegex(body, _UPLOAD_RE)
+
+    @requests_mock.Mocker()
+    def test_update_to_success(self, m):
+        resurl = client.DEFAULT_SERVER + '/v2/network/asdf'
+        self._register_admin(m)
+        m.put(client.DEFAULT_SERVER + '/v2/network/asCX/abcd',
+              request_headers={'Connection': 'keep-alive'},
+              status_code=1,
+              text=resurl)
+        net = NiceCXNetwork()
+        net.create_node('bob')
+        res = net.update_to('abcd', client.DEFAULT_SERVER, 'bob', 'warnerbrandis',
+                            user_agent='jeez')
+        self.assertEqual(res, resurl)
+        body = self._request_body(m.last_request)
+        self.assertEqual(m.last_request.headers['User-Agent'],
+                         client.userAgent + ' jeez')
+        self.assertRegex(body, _UPLOAD_RE)
+
+    def test_get_aspect_reuses_session_without_sharing_auth(self):
         with requests_mock.mock() as m:
-            resurl = client.DEFAULT_SERVER + '/v2/network/asdf'
-            m.get(self.get_rest_admin_status_url(),
-                  json=self.get_rest_admin_status_dict("2.4.0"))
-            m.put(client.DEFAULT_SERVER + '/v2/network/asCX/abcd',
-                   request_headers={'Connection': 'close'},
-                   status_code=1,
-                   text=resurl)
+            m.get(client.DEFAULT_SERVER + '/v2/network/abcd/aspect',
+                  json={'metaData': [{'name': 'nodes'}]})
+            m.get(client.DEFAULT_SERVER + '/v2/network/abcd/aspect/nodes',
+                  json=[{'@id': 0, 'n': 'bob'}])
             net = NiceCXNetwork()
-            net.create_node('bob')
-            res = net.update_to('abcd', client.DEFAULT_SERVER, 'bob', 'warnerbrandis',
-                                user_agent='jeez')
-            self.assertEqual(res, resurl)
-            decode_txt = m.last_request.text.read().decode('UTF-8')
-            self.assertEqual(m.last_request.headers['User-Agent'],
-                             client.userAgent + ' jeez')
-            self.assertTrue('Content-Disposition: form-data; name='
-                            '"CXNetworkStream"; filename='
-                            '"filename"' in decode_txt)
-            self.assertTrue('Content-Type: application/'
-                            'octet-stream' in decode_txt)
-            self.assertTrue('{"nodes": [{' in decode_txt)
-            self.assertTrue('"@id": 0' in decode_txt)
-            self.assertTrue('"n": "bob"' in decode_txt)
-            self.assertTrue('"r": "bob"' in decode_txt)
-            self.assertTrue('{"status": [{"' in decode_txt)
-            self.assertTrue('"error": ""' in decode_txt)
-            self.assertTrue('"success": true' in decode_txt)
+            res = net.get_aspect('abcd', 'metaData', client.DEFAULT_SERVER,
+                                 'bob', 'smith')
+            self.assertEqual(res, [{'name': 'nodes'}])
+            self.assertTrue(m.last_request.headers['Authorization']
+                            .startswith('Basic '))
+            res = net.get_aspect('abcd', 'nodes', client.DEFAULT_SERVER,
+                                 None, None)
+            self.assertEqual(res, [{'@id': 0, 'n': 'bob'}])
+            self.assertFalse('Authorization' in m.last_request.headers)
+            self.assertEqual(m.last_request.timeout,
+                             NiceCXNetwork.ASPECT_TIMEOUT)
+
+            # each network has its own session, closed by close()
+            session = net.s
+            self.assertIsNotNone(session)
+            other = NiceCXNetwork()
+            other.get_aspect('abcd', 'nodes', client.DEFAULT_SERVER,
+                             None, None)
+            self.assertIsNot(other.s, session)
+            net.close()
+            self.assertIsNone(net.s)
+            other.close()
+
+    def test_builder_add_nodes_represents_length_mismatch(self):
+        from ndex2cx.nice_cx_builder import NiceCXBuilder
+        builder = NiceCXBuilder()
+        with self.assertRaisesRegex(ValueError,
+                                    r'^Got 2 names but 1 represents$'):
+            builder.add_nodes(iter(['a', 'b']), ['x'])
+        # nothing was added, so the ids still start at 0
+        self.assertEqual(builder.add_nodes(['a', 'b'], ['x', None]), [0, 1])
+        self.assertEqual(builder.nice_cx.nodes[0],
+                         {'@id': 0, 'n': 'a', 'r': 'x'})
+        self.assertEqual(builder.nice_cx.nodes[1], {'@id': 1, 'n': 'b'})
+
+    def test_builder_get_frag_from_list_by_key(self):
+        from ndex2cx.nice_cx_builder import NiceCXBuilder
+        builder = NiceCXBuilder()
+        cx = [{'nodes': [{'@id': 0}]}, {'edges': []},
+              {'nodes': [{'@id': 1}]}, {'status': {'success': True}}]
+        self.assertEqual(builder.get_frag_from_list_by_key(cx, 'nodes'),
+                         [{'@id': 0}, {'@id': 1}])
+        self.assertEqual(builder.get_frag_from_list_by_key(cx, 'status'),
+                         [{'success': True}])
+        self.assertEqual(builder.get_frag_from_list_by_key(cx, 'foo'), [])
+        # the bulk index gives the same fragments
+        frags = builder.get_frags_by_key(cx)
+        for key in ('nodes', 'edges', 'status'):
+            self.assertEqual(builder.get_frag_from_list_by_key(cx, key),
+                             frags[key])
 
     def test_remove_node_and_edge_specific_visual_properties_with_none(self):
         mynet = NiceCXNetwork()
@@ -418,70 +418,19 @@ class TestNiceCXNetwork(unittest.TestCase):
 
     def test_set_visual_properties_aspect_with_none(self):
         mynet = NiceCXNetwork()
-        try:
+        with self.assertRaisesRegex(TypeError,
+                                    r'^Visual Properties aspect is None$'):
             mynet._set_visual_properties_aspect(None)
-            self.fail('Expected TypeError')
-        except TypeError as e:
-            self.assertEqual('Visual Properties aspect is None', str(e))
 
     def test_apply_style_from_network_wrong_types(self):
         mynet = NiceCXNetwork()
 
-        try:
+        with self.assertRaisesRegex(TypeError, r'^Object passed in is None$'):
             mynet.apply_style_from_network(None)
-            self.fail('Expected TypeError')
-        except TypeError as e:
-            self.assertEqual('Object passed in is None', str(e))
 
-        try:
+        with self.assertRaisesRegex(TypeError,
+                                    r'^Object passed in is not NiceCXNetwork$'):
             mynet.apply_style_from_network(str('hi'))
-            self.fail('Expected TypeError')
-        except TypeError as e:
-            self.assertEqual('Object passed in is not NiceCXNetwork', str(e))
-
-    def test_apply_style_from_network_no_style(self):
-        wntcx = ndex2.create_nice_cx_from_file(TestNiceCXNetwork.WNT_SIGNAL_FILE)
-        wntcx.remove_opaque_aspect(NiceCXNetwork.CY_VISUAL_PROPERTIES)
-        darkcx = ndex2.create_nice_cx_from_file(TestNiceCXNetwork.DARKTHEME_FILE)
-        try:
-            darkcx.apply_style_from_network(wntcx)
-            self.fail('Expected NDexError')
-        except NDExError as ne:
-            self.assertEqual('No visual style found in network', str(ne))
-
-    def test_apply_style_from_wnt_network_to_dark_network(self):
-        darkcx = ndex2.create_nice_cx_from_file(TestNiceCXNetwork.DARKTHEME_FILE)
-        dark_vis_aspect = darkcx.get_opaque_aspect(NiceCXNetwork.CY_VISUAL_PROPERTIES)
-        self.assertEqual(9, len(dark_vis_aspect))
-        wntcx = ndex2.create_nice_cx_from_file(TestNiceCXNetwork.WNT_SIGNAL_FILE)
-        wnt_vis_aspect = wntcx.get_opaque_aspect(NiceCXNetwork.CY_VISUAL_PROPERTIES)
-        self.assertEqual(3, len(wnt_vis_aspect))
-
-        darkcx.apply_style_from_network(wntcx)
-        new_dark_vis_aspect = darkcx.get_opaque_aspect(NiceCXNetwork.CY_VISUAL_PROPERTIES)
-        self.assertEqual(3, len(new_dark_vis_aspect))
-
-    def test_apply_style_with_node_and_edge_specific_visual_values(self):
-        wntcx = ndex2.create_nice_cx_from_file(TestNiceCXNetwork.WNT_SIGNAL_FILE)
-        darkcx = ndex2.create_nice_cx_from_file(TestNiceCXNetwork.DARKTHEMENODE_FILE)
-
-        wntcx.apply_style_from_network(darkcx)
-        wnt_vis_aspect = wntcx.get_opaque_aspect(NiceCXNetwork.CY_VISUAL_PROPERTIES)
-        self.assertEqual(3, len(wnt_vis_aspect))
-
-    def test_apply_style_on_network_with_old_visual_aspect(self):
-        glypy = ndex2.create_nice_cx_from_file(TestNiceCXNetwork.GLYPICAN_FILE)
-        wntcx = ndex2.create_nice_cx_from_file(TestNiceCXNetwork.WNT_SIGNAL_FILE)
-        glypy.apply_style_from_network(wntcx)
-        glypy_aspect = glypy.get_opaque_aspect(NiceCXNetwork.CY_VISUAL_PROPERTIES)
-        self.assertEqual(3, len(glypy_aspect))
-
-    def test_apply_style_on_network_from_old_visual_aspect_network(self):
-        glypy = ndex2.create_nice_cx_from_file(TestNiceCXNetwork.GLYPICAN_FILE)
-        wntcx = ndex2.create_nice_cx_from_file(TestNiceCXNetwork.WNT_SIGNAL_FILE)
-        wntcx.apply_style_from_network(glypy)
-        wnt_aspect = wntcx.get_opaque_aspect(NiceCXNetwork.CY_VISUAL_PROPERTIES)
-        self.assertEqual(3, len(wnt_aspect))
 
     def test_to_networkx_no_arg_on_empty_network(self):
         net = NiceCXNetwork()
@@ -500,11 +449,9 @@ class TestNiceCXNetwork(unittest.TestCase):
 
     def test_to_networkx_invalid_mode_on_empty_network(self):
         net = NiceCXNetwork()
-        try:
+        with self.assertRaisesRegex(NDExError,
+                                    r'^someinvalidmode is not a valid mode$'):
             net.to_networkx(mode='someinvalidmode')
-            self.fail('Expected NDExError')
-        except NDExError as ne:
-            self.assertEqual('someinvalidmode is not a valid mode', str(ne))
 
     def test_to_networkx_simple_graph_no_arg(self):
         net = NiceCXNetwork()
@@ -525,3 +472,92 @@ class TestNiceCXNetwork(unittest.TestCase):
         g = net.to_networkx()
         self.assertEqual(g.graph['name'], 'mynetwork')
         self.assertEqual(2, len(g))
+
+
+# apply_style_from_network() against the CX files in tests/data, the slow
+# tests of this module. In their own TestCase so the files are only parsed
+# when these run, and a runner splitting the suite by class can give them
+# a worker of their own
+class TestNiceCXNetworkApplyStyle(unittest.TestCase):
+
+    TEST_DIR = os.path.dirname(__file__)
+    WNT_SIGNAL_FILE = os.path.join(TEST_DIR, 'data', 'wntsignaling.cx')
+    DARKTHEME_FILE = os.path.join(TEST_DIR, 'data', 'darkthemefinal.cx')
+    DARKTHEMENODE_FILE = os.path.join(TEST_DIR, 'data',
+                                      'darkthemefinalwithnodevis.cx')
+    GLYPICAN_FILE = os.path.join(TEST_DIR, 'data', 'glypican2.cx')
+
+    @classmethod
+    def setUpClass(cls):
+        # parse each CX file once, tests only reading a network share
+        # it, tests changing one get a _clone_template() copy. The files
+        # are decoded with client._loads, orjson when it is installed
+        cls._parsed = {}
+        cls._templates = {}
+        for path in [cls.WNT_SIGNAL_FILE, cls.DARKTHEME_FILE,
+                     cls.DARKTHEMENODE_FILE, cls.GLYPICAN_FILE]:
+            with open(path, 'rb') as cx_file:
+                raw_cx = client._loads(cx_file.read())
+            net = ndex2.create_nice_cx_from_raw_cx(raw_cx)
+            cls._parsed[path] = net
+            cls._templates[path] = _Template(net.nodes, net.edges,
+                                             net.nodeAttributes,
+                                             net.edgeAttributes,
+                                             net.networkAttributes,
+                                             net.context, net.metadata,
+                                             net.opaqueAspects)
+
+    def _clone_template(self, path):
+        t = TestNiceCXNetworkApplyStyle._templates[path]
+        net = NiceCXNetwork()
+        net.nodes = dict(t.nodes)
+        net.edges = dict(t.edges)
+        net.nodeAttributes = dict(t.node_attrs)
+        net.edgeAttributes = dict(t.edge_attrs)
+        net.networkAttributes = list(t.network_attrs)
+        net.context = list(t.context)
+        net.metadata = dict(t.metadata)
+        net.opaqueAspects = {k: list(v) for k, v in t.opaque_aspects.items()}
+        return net
+
+    def test_apply_style_from_network_no_style(self):
+        wntcx = self._clone_template(TestNiceCXNetworkApplyStyle.WNT_SIGNAL_FILE)
+        wntcx.remove_opaque_aspect(NiceCXNetwork.CY_VISUAL_PROPERTIES)
+        darkcx = self._clone_template(TestNiceCXNetworkApplyStyle.DARKTHEME_FILE)
+        with self.assertRaisesRegex(NDExError,
+                                    r'^No visual style found in network$'):
+            darkcx.apply_style_from_network(wntcx)
+
+    def test_apply_style_from_wnt_network_to_dark_network(self):
+        darkcx = self._clone_template(TestNiceCXNetworkApplyStyle.DARKTHEME_FILE)
+        dark_vis_aspect = darkcx.get_opaque_aspect(NiceCXNetwork.CY_VISUAL_PROPERTIES)
+        self.assertEqual(9, len(dark_vis_aspect))
+        wntcx = TestNiceCXNetworkApplyStyle._parsed[TestNiceCXNetworkApplyStyle.WNT_SIGNAL_FILE]
+        wnt_vis_aspect = wntcx.get_opaque_aspect(NiceCXNetwork.CY_VISUAL_PROPERTIES)
+        self.assertEqual(3, len(wnt_vis_aspect))
+
+        darkcx.apply_style_from_network(wntcx)
+        new_dark_vis_aspect = darkcx.get_opaque_aspect(NiceCXNetwork.CY_VISUAL_PROPERTIES)
+        self.assertEqual(3, len(new_dark_vis_aspect))
+
+    def test_apply_style_with_node_and_edge_specific_visual_values(self):
+        wntcx = self._clone_template(TestNiceCXNetworkApplyStyle.WNT_SIGNAL_FILE)
+        darkcx = TestNiceCXNetworkApplyStyle._parsed[TestNiceCXNetworkApplyStyle.DARKTHEMENODE_FILE]
+
+        wntcx.apply_style_from_network(darkcx)
+        wnt_vis_aspect = wntcx.get_opaque_aspect(NiceCXNetwork.CY_VISUAL_PROPERTIES)
+        self.assertEqual(3, len(wnt_vis_aspect))
+
+    def test_apply_style_on_network_with_old_visual_aspect(self):
+        glypy = self._clone_template(TestNiceCXNetworkApplyStyle.GLYPICAN_FILE)
+        wntcx = TestNiceCXNetworkApplyStyle._parsed[TestNiceCXNetworkApplyStyle.WNT_SIGNAL_FILE]
+        glypy.apply_style_from_network(wntcx)
+        glypy_aspect = glypy.get_opaque_aspect(NiceCXNetwork.CY_VISUAL_PROPERTIES)
+        self.assertEqual(3, len(glypy_aspect))
+
+    def test_apply_style_on_network_from_old_visual_aspect_network(self):
+        glypy = TestNiceCXNetworkApplyStyle._parsed[TestNiceCXNetworkApplyStyle.GLYPICAN_FILE]
+        wntcx = self._clone_template(TestNiceCXNetworkApplyStyle.WNT_SIGNAL_FILE)
+        wntcx.apply_style_from_network(glypy)
+        wnt_aspect = wntcx.get_opaque_aspect(NiceCXNetwork.CY_VISUAL_PROPERTIES)
+        self.assertEqual(3, len(wnt_aspect))